@@ -1,13 +1,38 @@
 import os
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g, Response, stream_with_context, make_response
+from flask.json.provider import DefaultJSONProvider
+from flask.logging import default_handler
+from markupsafe import Markup
 import sqlite3
+import queue
+import logging
+import atexit
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import json
 from datetime import datetime, timedelta
 import random
 import hashlib
+import hmac
+import functools
 from dotenv import load_dotenv
 from gemini_utils import GeminiAI
 import re
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from utils import TTLCache, is_valid_email
+
+# Response compression is optional; without flask-compress responses are sent as-is
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+# orjson is optional too; jsonify falls back to the stdlib encoder without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Load environment variables
 load_dotenv()
@@ -16,32 +41,173 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = 'physics-tutor-secret-key-enhanced-2025'
 
+# Log through a queue so request threads never block on file or console writes;
+# a background listener writes to a rotating log file and the console
+LOG_FILE = 'physics_tutor.log'
+
+def configure_logging(flask_app):
+    """Route flask_app.logger and the root logger through a QueueHandler drained by a QueueListener"""
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=3, encoding='utf-8')
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    queue_handler = QueueHandler(log_queue)
+    flask_app.logger.removeHandler(default_handler)
+    flask_app.logger.addHandler(queue_handler)
+    flask_app.logger.setLevel(logging.DEBUG if flask_app.debug else logging.INFO)
+    flask_app.logger.propagate = False
+    
+    # gemini_utils, rag_utils and utils log to module loggers that propagate to
+    # the root logger; other libraries keep the root's WARNING threshold
+    logging.getLogger().addHandler(queue_handler)
+    for name in ('gemini_utils', 'rag_utils', 'utils'):
+        logging.getLogger(name).setLevel(flask_app.logger.level)
+
+configure_logging(app)
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes and decodes with orjson"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            # Dates and other non-native types go through Flask's own default()
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+if orjson:
+    app.json = ORJSONProvider(app)
+
+# Gzip HTML/JSON responses over 500 bytes (AI study plans and explanations run to tens of KB)
+if Compress:
+    Compress(app)
+else:
+    app.logger.warning("⚠️ flask-compress not installed; responses will not be compressed")
+
 # Add custom filters and functions to Jinja2 environment
 app.jinja_env.globals.update(chr=chr)
 
+@functools.lru_cache(maxsize=1024)
 def format_datetime(value):
     """Format datetime string to readable format"""
     try:
         dt = datetime.fromisoformat(value)
         return dt.strftime("%b %d, %Y at %I:%M %p")
-    except:
+    except (ValueError, TypeError):
         return value
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+# Markdown patterns used by format_markdown_content, compiled once at import
+_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+_ITALIC_RE = re.compile(r'\*(.*?)\*')
+# Classifies a paragraph by its prefix in a single match
+_DISPATCH_RE = re.compile(
+    r'^(?P<h1># )|^(?P<h2>## )|^(?P<h3>### )|^(?P<imp>important:)|^(?P<tip>tip:)',
+    re.IGNORECASE
+)
+# Emoji prefix for "## " section titles, first matching keyword wins
+_SECTION_EMOJI = (
+    ('day', '📅 '),
+    ('topic', '📚 '),
+    ('practice', '✍️ '),
+    ('test', '📝 '),
+    ('quiz', '📝 '),
+)
+
 # Initialize AI helper
 try:
     ai = GeminiAI()
-    print("✅ Gemini AI initialized successfully")
+    app.logger.info("✅ Gemini AI initialized successfully")
 except Exception as e:
-    print(f"❌ Failed to initialize Gemini AI: {e}")
+    app.logger.error(f"❌ Failed to initialize Gemini AI: {e}")
     ai = None
 
+# Gemini calls run on a shared worker pool so a hung request is abandoned after
+# AI_CALL_TIMEOUT seconds instead of holding the Flask worker indefinitely
+AI_CALL_TIMEOUT = 30
+_ai_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='gemini')
+
+def run_ai(fn, *args, **kwargs):
+    """Run an AI call on the worker pool, raising TimeoutError if it takes too long"""
+    future = _ai_executor.submit(fn, *args, **kwargs)
+    try:
+        return future.result(timeout=AI_CALL_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()
+        raise
+
+# SQLite connection pool: connections are reused across requests so the
+# page cache stays warm and PRAGMAs are only applied once per connection
+DB_PATH = 'students.db'
+DB_POOL_SIZE = 8
+_db_pool = queue.Queue(maxsize=DB_POOL_SIZE)
+
+def _new_db_connection():
+    """Open a tuned SQLite connection for the pool"""
+    # Pooled connections live for the whole process, so a larger prepared
+    # statement cache keeps every route's SQL compiled after first use
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA cache_size=-20000')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA mmap_size=268435456')
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
+
+def get_conn():
+    """Get the pooled database connection bound to the current request"""
+    if 'db_conn' not in g:
+        try:
+            g.db_conn = _db_pool.get_nowait()
+        except queue.Empty:
+            g.db_conn = _new_db_connection()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_conn(exception):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is None:
+        return
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _db_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
 def init_db():
     """Initialize Enhanced SQLite database with all required tables"""
-    conn = sqlite3.connect('students.db')
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
+    # WAL is persistent in the database file, so this applies to every later connection
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    
+    # Create the whole schema in one transaction. Seed data added here later
+    # should go through cursor.executemany rather than a per-row execute loop.
+    # IMMEDIATE takes the write lock up front, so several workers starting at
+    # once wait for each other instead of failing with "database is locked".
+    cursor.execute('BEGIN IMMEDIATE')
+    
     # Enhanced Students table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS students (
@@ -56,7 +222,7 @@ def init_db():
             gender TEXT,
             current_class INTEGER DEFAULT 10,
             school_name TEXT,
-            subjects TEXT DEFAULT 'Physics',
+            subjects TEXT DEFAULT '["Physics"]',
             board TEXT DEFAULT 'CBSE',
             study_mode TEXT DEFAULT 'Self-paced',
             notification_preferences TEXT DEFAULT 'email',
@@ -93,169 +259,207 @@ def init_db():
         )
     ''')
     
+    # Indexes for per-student history lookups
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_quiz_results_student_date ON quiz_results(student_id, quiz_date DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_study_sessions_student_date ON study_sessions(student_id, session_date DESC)')
+    # Covering index for per-chapter aggregates (chapter summaries read no table rows)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_quiz_results_student_chapter_score ON quiz_results(student_id, chapter, score, quiz_date)')
+    
+    # Generated study plans, one per student and chapter ('complete' for the full plan)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS study_plans (
+            student_id INTEGER NOT NULL,
+            chapter TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            plan_type TEXT NOT NULL,
+            generated_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (student_id, chapter),
+            FOREIGN KEY (student_id) REFERENCES students (id)
+        )
+    ''')
+    
+    # Per-student chapter totals, kept current by a trigger so the dashboard
+    # and study plan pages read one row per chapter instead of aggregating
+    # every quiz the student has taken
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'student_chapter_stats'")
+    stats_table_is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_chapter_stats (
+            student_id INTEGER NOT NULL,
+            chapter TEXT NOT NULL,
+            sum_score INTEGER NOT NULL DEFAULT 0,
+            sum_pct REAL NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_attempt TIMESTAMP,
+            best_score INTEGER,
+            lowest_score INTEGER,
+            PRIMARY KEY (student_id, chapter)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_quiz_results_stats
+        AFTER INSERT ON quiz_results
+        BEGIN
+            INSERT OR IGNORE INTO student_chapter_stats (student_id, chapter)
+            VALUES (NEW.student_id, COALESCE(NEW.chapter, 'General Physics'));
+            UPDATE student_chapter_stats
+            SET sum_score = sum_score + NEW.score,
+                sum_pct = sum_pct + CASE WHEN NEW.total_questions > 0
+                                         THEN NEW.score * 100.0 / NEW.total_questions ELSE 0 END,
+                attempts = attempts + 1,
+                last_attempt = MAX(COALESCE(last_attempt, NEW.quiz_date), NEW.quiz_date),
+                best_score = MAX(COALESCE(best_score, NEW.score), NEW.score),
+                lowest_score = MIN(COALESCE(lowest_score, NEW.score), NEW.score)
+            WHERE student_id = NEW.student_id
+              AND chapter = COALESCE(NEW.chapter, 'General Physics');
+        END
+    ''')
+    if stats_table_is_new:
+        # Quizzes recorded before the table existed
+        cursor.execute('''
+            INSERT INTO student_chapter_stats (student_id, chapter, sum_score, sum_pct, attempts, last_attempt,
+                                               best_score, lowest_score)
+            SELECT student_id, COALESCE(chapter, 'General Physics'), SUM(score),
+                   SUM(CASE WHEN total_questions > 0 THEN score * 100.0 / total_questions ELSE 0 END),
+                   COUNT(*), MAX(quiz_date), MAX(score), MIN(score)
+            FROM quiz_results
+            WHERE student_id IS NOT NULL
+            GROUP BY student_id, COALESCE(chapter, 'General Physics')
+        ''')
+    
+    conn.commit()
+    
+    # Refresh planner statistics so the indexes above are used; analysis_limit
+    # keeps this cheap on large databases
+    cursor.execute('PRAGMA analysis_limit=400')
+    cursor.execute('ANALYZE')
     conn.commit()
     conn.close()
-    print("✅ Enhanced database initialized successfully")
+    app.logger.info("✅ Enhanced database initialized successfully")
+
+# Routes rely on student_chapter_stats, its trigger and the study_plans table, so
+# the schema is brought up to date on import, whatever server loads the app
+init_db()
 
 def hash_password(dob):
     """Create a simple hash from DOB for password verification"""
+    return hashlib.blake2b(dob.encode(), digest_size=16).hexdigest()
+
+def _legacy_hash_password(dob):
+    """MD5 DOB hash used by older accounts, upgraded on their next login"""
     return hashlib.md5(dob.encode()).hexdigest()
 
+def parse_subjects(value):
+    """Decode the JSON subjects column, tolerating legacy plain-text rows"""
+    try:
+        subjects = json.loads(value)
+    except (TypeError, ValueError):
+        return [value] if value else ['Physics']
+    return subjects if isinstance(subjects, list) else ['Physics']
+
+def _render_paragraph(lines):
+    """Render accumulated paragraph lines, highlighting Important:/Tip: notes"""
+    paragraph = '\n'.join(lines)
+    match = _DISPATCH_RE.match(paragraph)
+    kind = match.lastgroup if match else None
+    
+    # Replace bold and italic markers before adding to HTML
+    paragraph = _BOLD_RE.sub(r'<strong>\1</strong>', paragraph)
+    paragraph = _ITALIC_RE.sub(r'<em>\1</em>', paragraph)
+    
+    # Check if it's a special section
+    if kind == 'imp':
+        return f'<div class="important-note">💡 {paragraph}</div>'
+    if kind == 'tip':
+        return f'<div class="study-tip">✨ {paragraph}</div>'
+    return f'<p class="study-text">{paragraph}</p>'
+
+# Inputs longer than this are rendered without caching to bound memory
+MARKDOWN_CACHE_MAX_LEN = 32_768
+
 def format_markdown_content(text):
     """Convert markdown-style content to HTML for proper display"""
-    from markupsafe import Markup
-    
     if not text:
         return text
-
-    # Initialize the HTML content
-    html_parts = []
-    
-    # Split into paragraphs and sections
-    current_section = []
+    if len(text) < MARKDOWN_CACHE_MAX_LEN:
+        return _render_markdown_cached(text)
+    return _render_markdown(text)
+
+def _render_markdown(text):
+    """Render markdown text to a study-plan HTML block"""
+    # Fast path: one line with no header, list or emphasis markers is just a
+    # paragraph (or an Important:/Tip: note), so skip the line walk entirely
+    if '\n' not in text and '#' not in text and '*' not in text:
+        line = text.strip()
+        if line and not line.startswith('- '):
+            return Markup(f'<div class="study-plan">{_render_paragraph([line])}</div>')
     
-    # Split into paragraphs
-    paragraphs = text.split('\n\n')
+    # Single pass over the lines: headers and blank lines close the open
+    # paragraph/list, bullets open or extend a list, other lines build a paragraph
+    parts = []
+    paragraph_lines = []
+    in_list = False
     bullet_count = 0  # Track number of bullet points to limit emoji usage
     
-    for paragraph in paragraphs:
-        paragraph = paragraph.strip()
-        if not paragraph:
+    for line in text.splitlines():
+        line = line.strip()
+        is_bullet = line.startswith(('- ', '* '))
+        match = _DISPATCH_RE.match(line) if line else None
+        kind = match.lastgroup if match else None
+        is_header = kind in ('h1', 'h2', 'h3')
+        
+        # Close whatever block this line ends
+        if paragraph_lines and (not line or is_header or is_bullet):
+            parts.append(_render_paragraph(paragraph_lines))
+            paragraph_lines = []
+        if in_list and not is_bullet:
+            parts.append('</ul>')
+            in_list = False
+        
+        if not line:
             continue
             
         # Check if it's a header
-        if paragraph.startswith('# '):
-            title = paragraph[2:].replace('**', '')
-            current_section.append(f'<div class="study-plan-header"><h1>{title}</h1></div>')
-            continue
-            
-        if paragraph.startswith('## '):
-            subtitle = paragraph[3:].replace('**', '')
+        if kind == 'h1':
+            title = line[2:].replace('**', '')
+            parts.append(f'<div class="study-plan-header"><h1>{title}</h1></div>')
+        elif kind == 'h2':
+            subtitle = line[3:].replace('**', '')
             # Add appropriate emoji based on section title
-            emoji = ''
-            if 'day' in subtitle.lower():
-                emoji = '📅 '
-            elif 'topic' in subtitle.lower():
-                emoji = '📚 '
-            elif 'practice' in subtitle.lower():
-                emoji = '✍️ '
-            elif 'test' in subtitle.lower() or 'quiz' in subtitle.lower():
-                emoji = '📝 '
-            current_section.append(f'<h2 class="study-section">{emoji}{subtitle}</h2>')
-            continue
-            
-        if paragraph.startswith('### '):
-            subheader = paragraph[4:].replace('**', '')
-            current_section.append(f'<h3 class="study-subsection">{subheader}</h3>')
-            continue
-            
-        # Handle bullet points with limited emojis
-        if any(line.strip().startswith(('- ', '* ')) for line in paragraph.split('\n')):
-            lines = paragraph.split('\n')
-            current_section.append('<ul class="study-list">')
-            for line in lines:
-                line = line.strip()
-                if line.startswith(('- ', '* ')):
-                    line = line[2:]
-                    # Process bold and italic before adding to list
-                    line = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', line)
-                    line = re.sub(r'\*(.*?)\*', r'<em>\1</em>', line)
-                    # Only add bullet emoji for first 3 items in a list
-                    bullet_emoji = '• ' if bullet_count >= 3 else '📌 '
-                    current_section.append(f'<li>{bullet_emoji}{line}</li>')
-                    bullet_count += 1
-            current_section.append('</ul>')
-            continue
-            
-        # Regular paragraph
-        # Replace bold and italic markers before adding to HTML
-        paragraph = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', paragraph)
-        paragraph = re.sub(r'\*(.*?)\*', r'<em>\1</em>', paragraph)
-        
-        # Check if it's a special section
-        if paragraph.lower().startswith('important:'):
-            current_section.append(f'<div class="important-note">💡 {paragraph}</div>')
-        elif paragraph.lower().startswith('tip:'):
-            current_section.append(f'<div class="study-tip">✨ {paragraph}</div>')
+            low = subtitle.lower()
+            emoji = next((e for key, e in _SECTION_EMOJI if key in low), '')
+            parts.append(f'<h2 class="study-section">{emoji}{subtitle}</h2>')
+        elif kind == 'h3':
+            subheader = line[4:].replace('**', '')
+            parts.append(f'<h3 class="study-subsection">{subheader}</h3>')
+        elif is_bullet:
+            # Handle bullet points with limited emojis
+            if not in_list:
+                parts.append('<ul class="study-list">')
+                in_list = True
+            item = _BOLD_RE.sub(r'<strong>\1</strong>', line[2:])
+            item = _ITALIC_RE.sub(r'<em>\1</em>', item)
+            # Only add bullet emoji for first 3 items in a list
+            bullet_emoji = '• ' if bullet_count >= 3 else '📌 '
+            parts.append(f'<li>{bullet_emoji}{item}</li>')
+            bullet_count += 1
         else:
-            current_section.append(f'<p class="study-text">{paragraph}</p>')
+            paragraph_lines.append(line)
+    
+    # Close any block still open at the end of the text
+    if paragraph_lines:
+        parts.append(_render_paragraph(paragraph_lines))
+    if in_list:
+        parts.append('</ul>')
     
     # Join all sections with proper container
-    formatted_content = '\n'.join(current_section)
+    formatted_content = '\n'.join(parts)
     
     # Return complete HTML with proper study plan container
     return Markup(f'<div class="study-plan">{formatted_content}</div>')
-    
-    # Close the main container and return
-    html_parts.append('</div>')
-    return '\n'.join(html_parts)
-    
-    lines = text.split('\n')
-    for line in lines:
-        line = line.strip()
-        if not line:
-            if current_list:
-                current_section.append(f'<ul class="study-plan-list">{" ".join(current_list)}</ul>')
-                current_list = []
-            continue
-        
-        # Handle headers
-        if line.startswith('# '):
-            title = line[2:]
-            sections.append(f'<div class="study-plan-header"><h1>{title}</h1></div>')
-        elif line.startswith('## '):
-            if current_list:
-                current_section.append(f'<ul class="study-plan-list">{" ".join(current_list)}</ul>')
-                current_list = []
-            if current_section:
-                sections.append(f'<div class="study-plan-section">{"".join(current_section)}</div>')
-            current_section = []
-            heading = line[3:]
-            current_section.append(f'<h2>{heading}</h2>')
-        elif line.startswith('### '):
-            if current_list:
-                current_section.append(f'<ul class="study-plan-list">{" ".join(current_list)}</ul>')
-                current_list = []
-            heading = line[4:]
-            current_section.append(f'<h3>{heading}</h3>')
-        # Handle list items
-        elif line.startswith('- ') or line.startswith('* '):
-            item = line[2:]
-            current_list.append(f'<li class="study-plan-item"><span class="study-icon">📝</span>{item}</li>')
-        # Handle topics
-        elif line.startswith('Topics to Cover:'):
-            if current_list:
-                current_section.append(f'<ul class="study-plan-list">{" ".join(current_list)}</ul>')
-                current_list = []
-            current_section.append('<div class="topics-section"><h4>� Topics to Cover:</h4>')
-        elif line.startswith('Practice Problems:'):
-            if current_list:
-                current_section.append(f'<ul class="study-plan-list">{" ".join(current_list)}</ul>')
-                current_list = []
-            current_section.append('<div class="practice-section"><h4>🎯 Practice Problems:</h4>')
-        # Regular paragraphs
-        else:
-            if current_list:
-                current_section.append(f'<ul class="study-plan-list">{" ".join(current_list)}</ul>')
-                current_list = []
-            current_section.append(f'<p class="study-plan-text">{line}</p>')
-    
-    # Add any remaining items
-    if current_list:
-        current_section.append(f'<ul class="study-plan-list">{" ".join(current_list)}</ul>')
-    if current_section:
-        sections.append(f'<div class="study-plan-section">{"".join(current_section)}</div>')
-    
-    # Join all sections
-    formatted_content = "".join(sections)
-    return f'<div class="study-plan-container">{formatted_content}</div>'
-    
-    # Wrap in main container
-    return f'<div class="study-plan-container">{formatted}</div>'
-    
-    return formatted
-    
-    return formatted
+
+# Rendering is pure, so repeated AI responses and saved plans reuse the result
+_render_markdown_cached = functools.lru_cache(maxsize=512)(_render_markdown)
 
 # Class 10 Physics Chapters
 PHYSICS_CHAPTERS = [
@@ -265,6 +469,99 @@ PHYSICS_CHAPTERS = [
     "Magnetic Effects of Electric Current"
 ]
 
+QUIZ_QUESTIONS_PATH = 'data/quiz_questions.json'
+
+def load_question_bank(path=QUIZ_QUESTIONS_PATH):
+    """Load the quiz question bank once and index it by chapter and difficulty"""
+    try:
+        with open(path, 'r') as f:
+            questions = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        app.logger.error(f"Error loading questions: {e}")
+        return None, {}, {}
+    
+    if not isinstance(questions, list):
+        app.logger.error(f"Error loading questions: expected a list in {path}")
+        return None, {}, {}
+    
+    # This runs at import, so a bad entry is skipped rather than stopping the app
+    valid = []
+    by_level = {}
+    by_chapter = {}
+    for q in questions:
+        if not isinstance(q, dict) or not q.get('question') or not q.get('options'):
+            continue
+        level = str(q.get('difficulty') or 'Medium').lower()
+        valid.append(q)
+        by_level.setdefault((q.get('chapter'), level), []).append(q)
+        by_chapter.setdefault(q.get('chapter') or '', []).append(q)
+    if len(valid) < len(questions):
+        app.logger.warning(f"⚠️ Skipped {len(questions) - len(valid)} malformed questions in {path}")
+    return valid, by_level, by_chapter
+
+def sample_questions(pool, k):
+    """Randomly pick up to k questions by sampling indices into the pool"""
+    k = min(k, len(pool))
+    return [pool[i] for i in random.sample(range(len(pool)), k)]
+
+# Active quizzes are kept server-side; the session cookie only carries a token
+QUIZ_CACHE_TTL = 3 * 60 * 60
+_QUIZ_CACHE = TTLCache(maxsize=2048, ttl=QUIZ_CACHE_TTL)
+
+# Dashboard data per student; dropped whenever the student's quizzes or study
+# sessions change. Focus areas only depend on the performance rows.
+DASHBOARD_CACHE_TTL = 60
+FOCUS_AREAS_CACHE_TTL = 10 * 60
+_DASHBOARD_CACHE = TTLCache(maxsize=4096, ttl=DASHBOARD_CACHE_TTL)
+_FOCUS_AREAS_CACHE = TTLCache(maxsize=4096, ttl=FOCUS_AREAS_CACHE_TTL)
+
+# Motivation widget: the 7-day stats per student, so dashboard refreshes don't
+# touch the database. The AI message itself is cached inside GeminiAI.get_motivation
+# (gemini_utils.MOTIVATION_CACHE_TTL), keyed by name, language and bucketed stats.
+MOTIVATION_STATS_CACHE_TTL = 5 * 60
+_MOTIVATION_STATS_CACHE = TTLCache(maxsize=4096, ttl=MOTIVATION_STATS_CACHE_TTL)
+
+def invalidate_student_caches(student_id):
+    """Drop cached dashboard and motivation data after the student's activity changes"""
+    _DASHBOARD_CACHE.pop(student_id)
+    _MOTIVATION_STATS_CACHE.pop(student_id)
+
+def get_focus_areas_cached(quiz_performance):
+    """Return AI focus areas for the performance rows, reusing recent results"""
+    key = tuple(quiz_performance)
+    focus_areas = _FOCUS_AREAS_CACHE.get(key)
+    if focus_areas is None:
+        focus_areas = ai.get_focus_areas(quiz_performance, PHYSICS_CHAPTERS)
+        _FOCUS_AREAS_CACHE.set(key, focus_areas)
+    return focus_areas
+
+def resolve_correct_index(question):
+    """Return the correct option index, handling both question formats"""
+    correct = question.get('correct_answer', None)
+    if correct is None:
+        return question.get('correct', 0)
+    if isinstance(correct, str):
+        try:
+            return question['options'].index(correct)
+        except ValueError:
+            return 0
+    return correct
+
+def store_active_quiz(questions):
+    """Cache the selected questions and remember their token in the session"""
+    token = secrets.token_urlsafe(16)
+    _QUIZ_CACHE.set(token, {
+        'questions': questions,
+        # Answer keys resolved once here so scoring is a plain int compare
+        'correct_idxs': [resolve_correct_index(q) for q in questions],
+        'start_mono': time.monotonic()
+    })
+    session['quiz_token'] = token
+    return token
+
+# Question bank loaded at startup; None when the JSON file is missing or invalid
+_ALL_QUESTIONS, _QUESTIONS_BY_LEVEL, _QUESTIONS_BY_CHAPTER = load_question_bank()
+
 @app.route('/')
 def index():
     """Landing page - check if user is logged in"""
@@ -278,21 +575,21 @@ def register():
     if request.method == 'POST':
         try:
             # Get form data with proper validation
-            full_name = request.form.get('full_name', '').strip()
-            email = request.form.get('email', '').strip().lower()
-            dob = request.form.get('dob', '').strip()
-            learning_goal = request.form.get('learning_goal', '').strip()
-            language = request.form.get('language', 'English')
+            form = request.form
+            full_name = form.get('full_name', '').strip()
+            email = form.get('email', '').strip().lower()
+            dob = form.get('dob', '').strip()
+            learning_goal = form.get('learning_goal', '').strip()
+            language = form.get('language', 'English')
             
-            # Debug prints
-            print(f"Registration attempt: {full_name}, {email}, {dob}")
+            app.logger.debug(f"Registration attempt: {full_name}, {email}")
             
             # Validation
             if not full_name:
                 flash('Full name is required!', 'danger')
                 return render_template('register.html')
             
-            if not email or '@' not in email:
+            if not is_valid_email(email):
                 flash('Valid email address is required!', 'danger')
                 return render_template('register.html')
             
@@ -309,15 +606,13 @@ def register():
                 dob_password = f"{dob_parts[2]}{dob_parts[1]}{dob_parts[0]}"  # DDMMYYYY
                 password_hash = hash_password(dob_password)
                 
-                print(f"DOB password will be: {dob_password}")
-                
             except Exception as e:
-                print(f"DOB conversion error: {e}")
+                app.logger.error(f"DOB conversion error: {e}")
                 flash('Invalid date format!', 'danger')
                 return render_template('register.html')
             
             # Database operations
-            conn = sqlite3.connect('students.db')
+            conn = get_conn()
             cursor = conn.cursor()
             
             try:
@@ -325,14 +620,13 @@ def register():
                 cursor.execute('SELECT id FROM students WHERE email = ?', (email,))
                 if cursor.fetchone():
                     flash('Email already registered! Please sign in.', 'warning')
-                    conn.close()
                     return redirect(url_for('login'))
                 
                 # Insert new user
                 cursor.execute('''
                     INSERT INTO students (full_name, email, dob, password_hash, learning_goal, language, current_class, subjects)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (full_name, email, dob, password_hash, learning_goal, language, 10, 'Physics'))
+                ''', (full_name, email, dob, password_hash, learning_goal, language, 10, json.dumps(['Physics'])))
                 
                 student_id = cursor.lastrowid
                 conn.commit()
@@ -340,22 +634,18 @@ def register():
                 if not student_id:
                     raise Exception("Failed to create user record")
                 
-                print(f"✅ User created with ID: {student_id}")
+                app.logger.info(f"✅ User created with ID: {student_id}")
                 
             except sqlite3.IntegrityError as e:
-                print(f"Database integrity error: {e}")
+                app.logger.error(f"Database integrity error: {e}")
                 flash('Email already exists or database error!', 'danger')
                 conn.rollback()
-                conn.close()
                 return render_template('register.html')
             except Exception as e:
-                print(f"Database error: {e}")
+                app.logger.error(f"Database error: {e}")
                 flash(f'Database error: {str(e)}', 'danger')
                 conn.rollback()
-                conn.close()
                 return render_template('register.html')
-            finally:
-                conn.close()
             
             # Set session
             session['student_id'] = student_id
@@ -368,12 +658,12 @@ def register():
             session['quiz_difficulty'] = 'medium'
             
             flash(f'Welcome {full_name}! Your account has been created successfully. Your login password is your DOB in DDMMYYYY format ({dob_password}).', 'success')
-            print(f"✅ New user registered: {full_name} ({email})")
+            app.logger.info(f"✅ New user registered: {full_name} ({email})")
             
             return redirect(url_for('dashboard'))
             
         except Exception as e:
-            print(f"❌ Registration error: {e}")
+            app.logger.error(f"❌ Registration error: {e}")
             flash(f'Registration failed: {str(e)}. Please try again.', 'danger')
             return render_template('register.html')
     
@@ -384,26 +674,34 @@ def login():
     """User login with email and DOB"""
     if request.method == 'POST':
         try:
-            email = request.form.get('email', '').strip().lower()
-            dob_password = request.form.get('dob_password', '').strip()
+            form = request.form
+            email = form.get('email', '').strip().lower()
+            dob_password = form.get('dob_password', '').strip()
             
             if not email or not dob_password:
                 flash('Please enter both email and date of birth!', 'danger')
                 return render_template('login.html')
             
             # Verify user
-            conn = sqlite3.connect('students.db')
+            conn = get_conn()
             cursor = conn.cursor()
             
             password_hash = hash_password(dob_password)
             cursor.execute('''
-                SELECT id, full_name, learning_goal, language, current_class, subjects 
+                SELECT id, full_name, learning_goal, language, current_class, subjects, password_hash
                 FROM students 
-                WHERE email = ? AND password_hash = ?
-            ''', (email, password_hash))
+                WHERE email = ?
+            ''', (email,))
             
             user = cursor.fetchone()
-            conn.close()
+            if user and not hmac.compare_digest(user[6], password_hash):
+                if hmac.compare_digest(user[6], _legacy_hash_password(dob_password)):
+                    # Migrate the stored MD5 hash now that the DOB is verified
+                    cursor.execute('UPDATE students SET password_hash = ? WHERE id = ?',
+                                   (password_hash, user[0]))
+                    conn.commit()
+                else:
+                    user = None
             
             if user:
                 # Set session
@@ -413,7 +711,7 @@ def login():
                 session['learning_goal'] = user[2] or ''
                 session['language'] = user[3] or 'English'
                 session['class_level'] = user[4] or 10
-                session['subjects'] = json.loads(user[5]) if user[5] else ['Physics']
+                session['subjects'] = parse_subjects(user[5])
                 session['quiz_difficulty'] = 'medium'
                 
                 flash(f'Welcome back, {user[1]}!', 'success')
@@ -423,7 +721,7 @@ def login():
                 return render_template('login.html')
                 
         except Exception as e:
-            print(f"❌ Login error: {e}")
+            app.logger.error(f"❌ Login error: {e}")
             flash('Login failed. Please try again.', 'danger')
             return render_template('login.html')
     
@@ -446,15 +744,16 @@ def settings():
     if request.method == 'POST':
         try:
             # Get form data
-            mobile_number = request.form.get('mobile_number', '').strip()
-            gender = request.form.get('gender', '').strip()
-            school_name = request.form.get('school_name', '').strip()
-            board = request.form.get('board', 'CBSE')
-            study_mode = request.form.get('study_mode', 'Self-paced')
-            notification_preferences = ','.join(request.form.getlist('notifications'))
+            form = request.form
+            mobile_number = form.get('mobile_number', '').strip()
+            gender = form.get('gender', '').strip()
+            school_name = form.get('school_name', '').strip()
+            board = form.get('board', 'CBSE')
+            study_mode = form.get('study_mode', 'Self-paced')
+            notification_preferences = ','.join(form.getlist('notifications'))
             
             # Update database
-            conn = sqlite3.connect('students.db')
+            conn = get_conn()
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -467,17 +766,15 @@ def settings():
                   notification_preferences, session['student_id']))
             
             conn.commit()
-            conn.close()
             
             flash('Settings updated successfully!', 'success')
             
         except Exception as e:
-            print(f"❌ Settings update error: {e}")
+            app.logger.error(f"❌ Settings update error: {e}")
             flash('Failed to update settings. Please try again.', 'danger')
     
     # Get current user data
-    conn = sqlite3.connect('students.db')
-    cursor = conn.cursor()
+    cursor = get_conn().cursor()
     
     cursor.execute('''
         SELECT full_name, email, dob, mobile_number, gender, current_class,
@@ -487,7 +784,6 @@ def settings():
     ''', (session['student_id'],))
     
     user_data = cursor.fetchone()
-    conn.close()
     
     if user_data:
         user_info = {
@@ -528,32 +824,25 @@ def start_quiz():
         
     try:
         # Get quiz parameters from form
-        chapter = request.form.get('chapter')
+        form = request.form
+        chapter = form.get('chapter')
         if not chapter:
             flash('Please select a chapter', 'danger')
             return redirect(url_for('quiz'))
             
-        level = request.form.get('level', 'medium')
+        level = form.get('level', 'medium')
         try:
-            num_questions = int(request.form.get('num_questions', 10))
+            num_questions = int(form.get('num_questions', 10))
         except ValueError:
             flash('Invalid number of questions', 'danger')
             return redirect(url_for('quiz'))
         
-        # Load and filter questions
-        try:
-            with open('data/quiz_questions.json', 'r') as f:
-                all_questions = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Error loading questions: {e}")
+        if _ALL_QUESTIONS is None:
             flash('Failed to load questions. Please try again.', 'danger')
             return redirect(url_for('quiz'))
             
-        # Filter questions by chapter and level
-        filtered_questions = [
-            q for q in all_questions 
-            if q.get('chapter') == chapter and q.get('difficulty', 'Medium').lower() == level.lower()
-        ]
+        # Look up questions by chapter and level (copied, AI questions may be appended)
+        filtered_questions = list(_QUESTIONS_BY_LEVEL.get((chapter, level.lower()), []))
         
         # If not enough questions from JSON, generate with AI
         if len(filtered_questions) < num_questions and ai:
@@ -568,7 +857,7 @@ def start_quiz():
                 if ai_questions:
                     filtered_questions.extend(ai_questions)
             except Exception as e:
-                print(f"Error generating AI questions: {e}")
+                app.logger.error(f"Error generating AI questions: {e}")
                 # Continue with available questions
                 pass
         
@@ -577,13 +866,12 @@ def start_quiz():
             flash('No questions available for selected criteria', 'danger')
             return redirect(url_for('quiz'))
             
-        selected_questions = random.sample(filtered_questions, min(num_questions, len(filtered_questions)))
+        selected_questions = sample_questions(filtered_questions, num_questions)
         
-        # Store quiz state in session
-        session['current_quiz_questions'] = selected_questions
+        # Store quiz state (questions server-side, small fields in session)
+        store_active_quiz(selected_questions)
         session['current_quiz_chapter'] = chapter
         session['quiz_difficulty'] = level
-        session['quiz_start_time'] = datetime.now().isoformat()
         
         return render_template('quiz_active.html',
                             questions=selected_questions,
@@ -591,7 +879,7 @@ def start_quiz():
                             level=level)
                             
     except Exception as e:
-        print(f"Error starting quiz: {e}")
+        app.logger.error(f"Error starting quiz: {e}")
         flash('An error occurred while starting the quiz. Please try again.', 'danger')
         return redirect(url_for('quiz'))
 
@@ -605,15 +893,18 @@ def get_quiz_questions():
     difficulty = session.get('quiz_difficulty', 'medium')
     
     try:
-        # Load questions from JSON first
-        with open('data/quiz_questions.json', 'r') as f:
-            all_questions = json.load(f)
+        # Use the question bank loaded at startup first
+        if _ALL_QUESTIONS is None:
+            return jsonify({'error': 'Failed to generate questions: question bank not available'}), 500
             
         filtered_questions = []
         if topic:  # If topic is selected
-            filtered_questions = [q for q in all_questions if topic.lower() in q['chapter'].lower()]
+            topic_lower = topic.lower()
+            filtered_questions = [q for bank_chapter, chapter_questions in _QUESTIONS_BY_CHAPTER.items()
+                                  if topic_lower in bank_chapter.lower()
+                                  for q in chapter_questions]
         else:  # Mixed topics
-            filtered_questions = all_questions
+            filtered_questions = list(_ALL_QUESTIONS)
             
         # Filter by difficulty if specified
         if difficulty == 'easy':
@@ -634,22 +925,21 @@ def get_quiz_questions():
                 filtered_questions.extend(ai_questions)
         
         # Randomly select 10 questions
-        selected_questions = random.sample(filtered_questions, min(10, len(filtered_questions)))
+        selected_questions = sample_questions(filtered_questions, 10)
         
         if not selected_questions:
             return jsonify({'error': 'No questions available for selected topic'}), 500
         
-        # Store quiz state in session
+        # Store quiz state (questions server-side, small fields in session)
+        store_active_quiz(selected_questions)
         session['current_quiz_subject'] = 'Physics'
         session['current_quiz_topic'] = topic
-        session['current_quiz_questions'] = selected_questions
-        session['quiz_start_time'] = datetime.now().isoformat()
         
-        print(f"✅ Generated {len(selected_questions)} questions for topic: {topic}")
+        app.logger.info(f"✅ Generated {len(selected_questions)} questions for topic: {topic}")
         return jsonify({'questions': selected_questions})
         
     except Exception as e:
-        print(f"❌ Error generating quiz: {e}")
+        app.logger.error(f"❌ Error generating quiz: {e}")
         return jsonify({'error': f'Failed to generate questions: {str(e)}'}), 500
 
 @app.route('/submit_quiz', methods=['POST'])
@@ -658,16 +948,19 @@ def submit_quiz():
     try:
         data = request.get_json()
         answers = data.get('answers', [])
-        questions = session.get('current_quiz_questions', [])
+        quiz_token = session.get('quiz_token')
+        active_quiz = _QUIZ_CACHE.get(quiz_token, {}) if quiz_token else {}
+        questions = active_quiz.get('questions', [])
+        correct_idxs = active_quiz.get('correct_idxs', [])
         subject = session.get('current_quiz_subject', 'Physics')
         chapter = session.get('current_quiz_chapter', 'General Physics')
-        quiz_start_time = datetime.fromisoformat(session.get('quiz_start_time', datetime.now().isoformat()))
+        quiz_start_mono = active_quiz.get('start_mono', time.monotonic())
 
         if not questions:
             return jsonify({'error': 'No quiz questions found'}), 400
 
         # Calculate score and prepare questions with answers
-        correct_answers = 0
+        correct_answers = sum(1 for answer, correct in zip(answers, correct_idxs) if answer == correct)
         quiz_data = []
         
         for i, question in enumerate(questions):
@@ -675,47 +968,42 @@ def submit_quiz():
                 continue
                 
             user_answer = answers[i]
-            # Handle both formats of correct answer
-            correct = question.get('correct_answer', None)
-            if correct is None:
-                correct = question.get('correct', 0)
-            elif isinstance(correct, str):
-                try:
-                    correct = question['options'].index(correct)
-                except ValueError:
-                    correct = 0
-            
+            correct = correct_idxs[i]
             is_correct = user_answer == correct
-            if is_correct:
-                correct_answers += 1
-                
-            # Get or generate short explanation
-            explanation = question.get('explanation', '')
-            if not explanation and ai:
-                try:
-                    explanation = ai.get_quick_explanation(
-                        question=question['question'],
-                        correct_answer=question['options'][correct],
-                        subject='Physics',
-                        class_level=10
-                    )
-                except:
-                    explanation = "Explanation will be provided by the tutor."
             
             quiz_data.append({
                 'question': question['question'],
                 'options': question['options'],
                 'user_answer': user_answer,
                 'correct_answer': correct,
-                'explanation': explanation,
+                'explanation': question.get('explanation', ''),
                 'is_correct': is_correct
             })
 
+        # Explain wrong answers lacking a stored explanation with one AI call
+        need_explanation = [item for item in quiz_data if not item['explanation'] and not item['is_correct']]
+        if need_explanation and ai:
+            try:
+                explanations = ai.get_quick_explanations_batch(
+                    [{'question': item['question'],
+                      'correct_answer': item['options'][item['correct_answer']]}
+                     for item in need_explanation],
+                    subject='Physics',
+                    class_level=10
+                )
+                for item, explanation in zip(need_explanation, explanations):
+                    item['explanation'] = explanation
+            except Exception as e:
+                app.logger.error(f"❌ Error generating quiz explanations: {e}")
+        for item in quiz_data:
+            if not item['explanation']:
+                item['explanation'] = "Explanation will be provided by the tutor."
+
         score = int((correct_answers / len(questions)) * 100) if questions else 0
-        time_taken = (datetime.now() - quiz_start_time).seconds
+        time_taken = int(time.monotonic() - quiz_start_mono)
 
         # Store quiz result
-        conn = sqlite3.connect('students.db')
+        conn = get_conn()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO quiz_results (student_id, subject, chapter, score, total_questions, difficulty_level)
@@ -723,7 +1011,9 @@ def submit_quiz():
         ''', (session['student_id'], subject, chapter, correct_answers, len(questions), session.get('quiz_difficulty', 'medium')))
         
         conn.commit()
-        conn.close()
+        _QUIZ_CACHE.pop(quiz_token)
+        invalidate_student_caches(session['student_id'])
+        session.pop('quiz_token', None)
 
         # Store result data in session for results page
         session['quiz_results'] = {
@@ -748,7 +1038,7 @@ def submit_quiz():
         return jsonify({'redirect': url_for('quiz_results')})
 
     except Exception as e:
-        print(f"❌ Error submitting quiz: {e}")
+        app.logger.error(f"❌ Error submitting quiz: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/quiz/results')
@@ -787,7 +1077,32 @@ def get_detailed_explanation(question_index):
         return jsonify({'explanation': formatted_explanation})
         
     except Exception as e:
-        print(f"❌ Error generating detailed explanation: {e}")
+        app.logger.error(f"❌ Error generating detailed explanation: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/get_detailed_explanations')
+def get_detailed_explanations():
+    """Get detailed AI-generated explanations for every question of the last quiz at once"""
+    if not ai or 'quiz_results' not in session:
+        return jsonify({'error': 'Service not available'}), 500
+        
+    try:
+        questions = session['quiz_results']['questions']
+        explanations = run_ai(
+            ai.get_detailed_explanations_batch,
+            [{'question': question['question'],
+              'correct_answer': question['options'][question['correct_answer']],
+              'user_answer': question['options'][question['user_answer']]}
+             for question in questions],
+            subject='Physics',
+            class_level=10,
+            chapter=session.get('current_quiz_chapter', '')
+        )
+        
+        return jsonify({'explanations': [format_markdown_content(explanation) for explanation in explanations]})
+        
+    except Exception as e:
+        app.logger.error(f"❌ Error generating detailed explanations: {e}")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/dashboard')
@@ -797,33 +1112,33 @@ def dashboard():
         return redirect(url_for('login'))
 
     try:
-        conn = sqlite3.connect('students.db')
-        cursor = conn.cursor()
-
-        # Get chapter-wise performance
-        cursor.execute('''
-            SELECT chapter, AVG(score) as avg_score, COUNT(*) as quiz_count
-            FROM quiz_results
-            WHERE student_id = ?
-            GROUP BY chapter
-        ''', (session['student_id'],))
-        quiz_performance = cursor.fetchall()
+        student_id = session['student_id']
+        cached = _DASHBOARD_CACHE.get(student_id)
+        if cached is None:
+            # Chapter-wise performance and the 7-day streak in one round-trip;
+            # the 'streak' row always sorts after the 'perf' rows
+            rows = get_conn().execute('''
+                SELECT 'perf' as kind, chapter, sum_score * 1.0 / attempts as avg_score, attempts as quiz_count
+                FROM student_chapter_stats
+                WHERE student_id = ?
+                UNION ALL
+                SELECT 'streak', NULL, NULL, COUNT(DISTINCT session_date)
+                FROM study_sessions
+                WHERE student_id = ? AND session_date >= date('now', '-7 days')
+                ORDER BY kind, chapter
+            ''', (student_id, student_id)).fetchall()
+            quiz_performance = [row[1:] for row in rows if row[0] == 'perf']
+            daily_streak = rows[-1][3] if rows and rows[-1][0] == 'streak' else 0
 
-        # Calculate daily streak
-        cursor.execute('''
-            SELECT COUNT(DISTINCT session_date) as streak
-            FROM study_sessions
-            WHERE student_id = ? AND session_date >= date('now', '-7 days')
-        ''', (session['student_id'],))
-        streak_result = cursor.fetchone()
-        daily_streak = streak_result[0] if streak_result else 0
+            # Generate focus areas using AI
+            focus_areas = []
+            if ai:
+                focus_areas = get_focus_areas_cached(quiz_performance)
 
-        conn.close()
+            cached = (quiz_performance, daily_streak, focus_areas)
+            _DASHBOARD_CACHE.set(student_id, cached)
 
-        # Generate focus areas using AI
-        focus_areas = []
-        if ai:
-            focus_areas = ai.get_focus_areas(quiz_performance, PHYSICS_CHAPTERS)
+        quiz_performance, daily_streak, focus_areas = cached
 
         return render_template('dashboard.html',
                              quiz_performance=quiz_performance,
@@ -832,10 +1147,30 @@ def dashboard():
                              chapters=PHYSICS_CHAPTERS)
 
     except Exception as e:
-        print(f"❌ Error loading dashboard: {e}")
+        app.logger.error(f"❌ Error loading dashboard: {e}")
         flash('Error loading dashboard data.', 'danger')
         return render_template('dashboard.html', quiz_performance=[], daily_streak=0, focus_areas=[], chapters=PHYSICS_CHAPTERS)
 
+def save_study_plan(student_id, chapter, plan, plan_type):
+    """Store a generated study plan, replacing any earlier plan for the chapter"""
+    conn = get_conn()
+    conn.execute('''
+        INSERT OR REPLACE INTO study_plans (student_id, chapter, plan, plan_type, generated_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (student_id, chapter, str(plan), plan_type, datetime.now().isoformat()))
+    conn.commit()
+
+def load_study_plans(student_id):
+    """Return the student's saved plans as {chapter: {'plan', 'generated_at', 'type'}}"""
+    rows = get_conn().execute('''
+        SELECT chapter, plan, generated_at, plan_type
+        FROM study_plans
+        WHERE student_id = ?
+        ORDER BY chapter
+    ''', (student_id,)).fetchall()
+    return {chapter: {'plan': Markup(plan), 'generated_at': generated_at, 'type': plan_type}
+            for chapter, plan, generated_at, plan_type in rows}
+
 @app.route('/study_plan', methods=['GET', 'POST'])
 def study_plan():
     """Generate enhanced study plan with proper formatting"""
@@ -847,13 +1182,11 @@ def study_plan():
                              study_plan="<div class='alert alert-warning'><strong>AI service not available.</strong> Please check your internet connection.</div>")
 
     try:
-        # Initialize study plans in session if not exists
-        if 'study_plans' not in session:
-            session['study_plans'] = {}
+        # Plans live in the study_plans table; drop any copy left in an old session cookie
+        session.pop('study_plans', None)
 
         # Get student performance data for the specific chapter
-        conn = sqlite3.connect('students.db')
-        cursor = conn.cursor()
+        cursor = get_conn().cursor()
         
         if request.method == 'POST':
             plan_type = request.form.get('plan_type')
@@ -866,30 +1199,29 @@ def study_plan():
             # Get performance data for the specific chapter
             if chapter:
                 cursor.execute('''
-                    SELECT chapter, AVG(score) as avg_score, COUNT(*) as attempts,
-                           MAX(quiz_date) as last_attempt
-                    FROM quiz_results
+                    SELECT chapter, sum_score * 1.0 / attempts as avg_score, attempts,
+                           last_attempt
+                    FROM student_chapter_stats
                     WHERE student_id = ? AND chapter = ?
-                    GROUP BY chapter
                 ''', (session['student_id'], chapter))
             else:
                 cursor.execute('''
-                    SELECT chapter, AVG(score) as avg_score, COUNT(*) as attempts,
-                           MAX(quiz_date) as last_attempt
-                    FROM quiz_results
+                    SELECT chapter, sum_score * 1.0 / attempts as avg_score, attempts,
+                           last_attempt
+                    FROM student_chapter_stats
                     WHERE student_id = ?
-                    GROUP BY chapter
+                    ORDER BY chapter
                 ''', (session['student_id'],))
             
             performance_data = cursor.fetchall()
-            conn.close()
 
             # Generate study plan with focused content
             topics = [chapter] if chapter else PHYSICS_CHAPTERS
             duration = 'week' if plan_type == 'chapter' else 'month'
 
             # Generate study plan based on type
-            raw_study_plan = ai.generate_study_plan(
+            raw_study_plan = run_ai(
+                ai.generate_study_plan,
                 class_level=session.get('class_level', 10),
                 subjects=topics,
                 learning_goal=session.get('learning_goal', ''),
@@ -901,57 +1233,45 @@ def study_plan():
             # Format the study plan with proper HTML styling
             formatted_study_plan = format_markdown_content(raw_study_plan)
 
-            # Save the plan in session
+            # Save the plan for the student
             if chapter:
-                session['study_plans'][chapter] = {
-                    'plan': formatted_study_plan,
-                    'generated_at': datetime.now().isoformat(),
-                    'type': 'chapter'
-                }
+                save_study_plan(session['student_id'], chapter, formatted_study_plan, 'chapter')
             else:
-                session['study_plans']['complete'] = {
-                    'plan': formatted_study_plan,
-                    'generated_at': datetime.now().isoformat(),
-                    'type': 'complete'
-                }
-            session.modified = True
-
-            print("✅ Enhanced study plan generated and saved successfully")
+                save_study_plan(session['student_id'], 'complete', formatted_study_plan, 'complete')
+
+            app.logger.info("✅ Enhanced study plan generated and saved successfully")
             return render_template('study_plan.html', 
                                 study_plan=formatted_study_plan, 
                                 chapters=PHYSICS_CHAPTERS,
                                 show_form=True,
-                                saved_plans=session['study_plans'])
+                                saved_plans=load_study_plans(session['student_id']))
         else:
             # Get chapter-wise performance for the overview
             cursor.execute('''
                 SELECT chapter, 
-                       ROUND(AVG(CAST(score AS FLOAT) * 100.0 / total_questions), 1) as avg_score, 
-                       COUNT(*) as quiz_count
-                FROM quiz_results
+                       ROUND(sum_pct / attempts, 1) as avg_score, 
+                       attempts as quiz_count
+                FROM student_chapter_stats
                 WHERE student_id = ?
-                GROUP BY chapter
+                ORDER BY chapter
             ''', (session['student_id'],))
             quiz_performance = cursor.fetchall()
             
-            # Add default entries for chapters with no data
+            # Add placeholder entries for chapters with no quiz data
             existing_chapters = {row[0] for row in quiz_performance}
-            for chapter in PHYSICS_CHAPTERS:
-                if chapter not in existing_chapters:
-                    # For chapters without quiz data, create placeholder entry
-                    quiz_performance = list(quiz_performance)
-                    quiz_performance.append((chapter, 0, 0))
+            quiz_performance += [(chapter, 0, 0) for chapter in PHYSICS_CHAPTERS
+                                 if chapter not in existing_chapters]
             
             # Show the form and saved plans on GET request
             return render_template('study_plan.html', 
                                 study_plan=None,
                                 chapters=PHYSICS_CHAPTERS,
                                 show_form=True,
-                                saved_plans=session.get('study_plans', {}),
+                                saved_plans=load_study_plans(session['student_id']),
                                 quiz_performance=quiz_performance)
 
     except Exception as e:
-        print(f"❌ Error generating study plan: {e}")
+        app.logger.error(f"❌ Error generating study plan: {e}")
         error_plan = f"""
         <div class='alert alert-danger'>
             <h5><i class='fas fa-exclamation-triangle'></i> Unable to generate study plan</h5>
@@ -971,6 +1291,30 @@ def chatbot():
                          email=session.get('email', ''),
                          chapters=PHYSICS_CHAPTERS)
 
+def wants_event_stream():
+    """True when the client asked for a server-sent event stream instead of JSON"""
+    best = request.accept_mimetypes.best_match(['application/json', 'text/event-stream'])
+    return best == 'text/event-stream'
+
+def sse_response(events, finalize=None):
+    """Send ('chunk', text) / ('html', block) / ('done', html) AI events as server-sent events
+    
+    'html' blocks are progressive previews; the 'done' event carries the final
+    response (after finalize) that clients should keep.
+    """
+    def generate():
+        for kind, payload in events:
+            if kind == 'done':
+                html = finalize(payload) if finalize else payload
+                yield f"event: done\ndata: {json.dumps({'response': html, 'status': 'success'})}\n\n"
+            elif kind == 'html':
+                yield f"event: html\ndata: {json.dumps({'html': payload})}\n\n"
+            else:
+                yield f"event: chunk\ndata: {json.dumps({'chunk': payload})}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat messages with Gemini AI"""
@@ -997,7 +1341,12 @@ def chat():
             'chat_history': history[-5:]  # Use last 5 messages for context
         }
 
-        response = ai.chat(
+        # Clients sending Accept: text/event-stream get tokens as they arrive
+        if wants_event_stream():
+            return sse_response(ai.chat_stream(message=message, context=context))
+
+        response = run_ai(
+            ai.chat,
             message=message,
             context=context
         )
@@ -1009,7 +1358,7 @@ def chat():
         })
 
     except Exception as e:
-        print(f"❌ Chat error: {e}")
+        app.logger.error(f"❌ Chat error: {e}")
         return jsonify({
             'error': f'Failed to process message: {str(e)}',
             'status': 'error'
@@ -1028,8 +1377,17 @@ def ask_doubt():
         if not question:
             return jsonify({'error': 'No question provided'}), 400
 
+        if wants_event_stream():
+            return sse_response(ai.solve_doubt_stream(
+                question=question,
+                class_level=session.get('class_level', 10),
+                language=session.get('language', 'English'),
+                subjects=PHYSICS_CHAPTERS
+            ), finalize=format_markdown_content)
+
         # Get AI response
-        raw_response = ai.solve_doubt(
+        raw_response = run_ai(
+            ai.solve_doubt,
             question=question,
             class_level=session.get('class_level', 10),
             language=session.get('language', 'English'),
@@ -1039,11 +1397,11 @@ def ask_doubt():
         # Format the response with proper HTML styling
         formatted_response = format_markdown_content(raw_response)
 
-        print(f"✅ Enhanced doubt solved for: {question[:50]}...")
+        app.logger.info(f"✅ Enhanced doubt solved for: {question[:50]}...")
         return jsonify({'response': formatted_response})
 
     except Exception as e:
-        print(f"❌ Error solving doubt: {e}")
+        app.logger.error(f"❌ Error solving doubt: {e}")
         error_response = f"""
         <div class='alert alert-danger'>
             <h6><i class='fas fa-exclamation-triangle'></i> Unable to process your question</h6>
@@ -1073,32 +1431,35 @@ def get_motivation():
         })
         
     try:
-
-        # Get recent performance
-        conn = sqlite3.connect('students.db')
-        cursor = conn.cursor()
-        
-        # Get quiz performance
-        cursor.execute('''
-            SELECT AVG(score) as recent_avg, COUNT(*) as quiz_count
-            FROM quiz_results
-            WHERE student_id = ? AND quiz_date >= date('now', '-7 days')
-        ''', (session['student_id'],))
-        result = cursor.fetchone()
-        recent_performance = result[0] if result and result[0] else 50
-        quiz_count = result[1] if result else 0
-        
-        # Get study streak
-        cursor.execute('''
-            SELECT COUNT(DISTINCT session_date) as streak
-            FROM study_sessions
-            WHERE student_id = ? AND session_date >= date('now', '-7 days')
-        ''', (session['student_id'],))
-        streak_result = cursor.fetchone()
-        study_streak = streak_result[0] if streak_result else 0
+        student_id = session['student_id']
+        stats = _MOTIVATION_STATS_CACHE.get(student_id)
+        if stats is None:
+            # Get recent performance
+            cursor = get_conn().cursor()
+            
+            # Get quiz performance
+            cursor.execute('''
+                SELECT AVG(score) as recent_avg, COUNT(*) as quiz_count
+                FROM quiz_results
+                WHERE student_id = ? AND quiz_date >= date('now', '-7 days')
+            ''', (student_id,))
+            result = cursor.fetchone()
+            recent_performance = result[0] if result and result[0] else 50
+            quiz_count = result[1] if result else 0
+            
+            # Get study streak
+            cursor.execute('''
+                SELECT COUNT(DISTINCT session_date) as streak
+                FROM study_sessions
+                WHERE student_id = ? AND session_date >= date('now', '-7 days')
+            ''', (student_id,))
+            streak_result = cursor.fetchone()
+            study_streak = streak_result[0] if streak_result else 0
+            
+            stats = (recent_performance, quiz_count, study_streak)
+            _MOTIVATION_STATS_CACHE.set(student_id, stats)
+        recent_performance, quiz_count, study_streak = stats
         
-        conn.close()
-
         # Generate personalized motivational content with dynamic inspiration
         if quiz_count == 0 and study_streak == 0:
             motivation = "🌟 <strong>Welcome to your physics journey!</strong> Take your first quiz to get started! 📚"
@@ -1132,7 +1493,7 @@ def get_motivation():
         })
 
     except Exception as e:
-        print(f"❌ Error generating motivation: {e}")
+        app.logger.error(f"❌ Error generating motivation: {e}")
         fallback_quotes = [
             f"🌟 <strong>Keep shining, {session.get('name', 'Student')}!</strong> Your dedication to physics is inspiring! �",
             "⚡ <strong>Physics mastery comes one concept at a time.</strong> You're making great progress! 🚀",
@@ -1152,18 +1513,25 @@ def view_study_plan(chapter):
     if 'student_id' not in session:
         return redirect(url_for('login'))
         
-    saved_plans = session.get('study_plans', {})
+    saved_plans = load_study_plans(session['student_id'])
     if chapter in saved_plans:
-        return render_template('study_plan.html',
+        response = make_response(render_template('study_plan.html',
                              study_plan=saved_plans[chapter]['plan'],
                              chapters=PHYSICS_CHAPTERS,
                              show_form=True,
                              saved_plans=saved_plans,
-                             viewing_chapter=chapter)
+                             viewing_chapter=chapter))
+        # Saved plans don't change once generated, so repeat views can be answered with 304
+        response.add_etag()
+        return response.make_conditional(request)
     else:
         flash('No study plan found for this chapter. Please generate one.', 'warning')
         return redirect(url_for('study_plan'))
 
+# Repeat clicks for the same student/day/chapter within a second skip the write
+STUDY_MARK_COALESCE_SECONDS = 1
+_RECENT_STUDY_MARKS = TTLCache(maxsize=4096, ttl=STUDY_MARK_COALESCE_SECONDS)
+
 @app.route('/mark_study_session', methods=['POST'])
 def mark_study_session():
     """Mark study session as completed"""
@@ -1175,25 +1543,36 @@ def mark_study_session():
         chapter = data.get('chapter', 'General Physics')
         
         today = datetime.now().date()
-        conn = sqlite3.connect('students.db')
-        cursor = conn.cursor()
+        mark_key = (session['student_id'], today, chapter)
+        # Claimed atomically before the write, so concurrent double-clicks insert once
+        if not _RECENT_STUDY_MARKS.add(mark_key, True):
+            return jsonify({'success': True})
 
-        cursor.execute('''
-            INSERT OR REPLACE INTO study_sessions (student_id, session_date, chapter, topics_completed)
-            VALUES (?, ?, ?, 1)
-        ''', (session['student_id'], today, chapter))
+        conn = get_conn()
+        cursor = conn.cursor()
 
-        conn.commit()
-        conn.close()
+        try:
+            # Take the write lock up front so concurrent marks wait on busy_timeout
+            # instead of failing when a deferred read lock is upgraded
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                INSERT OR REPLACE INTO study_sessions (student_id, session_date, chapter, topics_completed)
+                VALUES (?, ?, ?, 1)
+            ''', (session['student_id'], today, chapter))
+            conn.commit()
+        except Exception:
+            # Let a retry through after a failed write
+            _RECENT_STUDY_MARKS.pop(mark_key)
+            raise
+        invalidate_student_caches(session['student_id'])
 
         return jsonify({'success': True})
 
     except Exception as e:
-        print(f"❌ Error marking study session: {e}")
+        app.logger.error(f"❌ Error marking study session: {e}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    init_db()
     print("🚀 Starting Enhanced Class 10 Physics AI Tutor...")
     print("=" * 60)
     print(f"📊 Database: {'✅ Ready' if os.path.exists('students.db') else '❌ Error'}")
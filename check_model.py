@@ -1,16 +1,50 @@
 import os
+import sys
+import json
+import time
 from google import genai
 from dotenv import load_dotenv
 
 load_dotenv()
 
-api_key = os.getenv('GEMINI_API_KEY')
-client = genai.Client(api_key=api_key)
+# Model names rarely change, so reuse the last listing for a day (pass --refresh to force)
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'physics_tutor', 'models.json')
+CACHE_TTL = 24 * 60 * 60
+
+def load_cached_models():
+    """Return cached model names if the cache file is fresh, else None"""
+    try:
+        if time.time() - os.path.getmtime(CACHE_PATH) < CACHE_TTL:
+            with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except (OSError, ValueError):
+        pass
+    return None
+
+def save_cached_models(names):
+    """Write model names to the cache file"""
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(names, f)
+    except OSError as e:
+        print(f"⚠️ Could not write model cache: {e}")
 
 print("🔍 Checking available models for your key...")
-try:
-    # This asks Google: "What works?"
-    for model in client.models.list():
-        print(f"✅ Found: {model.name}")
-except Exception as e:
-    print(f"❌ Error listing models: {e}")
\ No newline at end of file
+models = None if '--refresh' in sys.argv else load_cached_models()
+if models is not None:
+    print(f"📦 Using cached list from {CACHE_PATH}")
+    for name in models:
+        print(f"✅ Found: {name}")
+else:
+    api_key = os.getenv('GEMINI_API_KEY')
+    client = genai.Client(api_key=api_key)
+    try:
+        # This asks Google: "What works?"
+        models = []
+        for model in client.models.list():
+            print(f"✅ Found: {model.name}")
+            models.append(model.name)
+        save_cached_models(models)
+    except Exception as e:
+        print(f"❌ Error listing models: {e}")
\ No newline at end of file
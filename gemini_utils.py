@@ -1,294 +1,1090 @@
 import os
-from google import genai
+import logging
+import asyncio
+import threading
+import time
 from dotenv import load_dotenv
 import json
 import random
 import re
+import io
+import textwrap
+from collections import defaultdict
+from functools import cached_property, lru_cache
+from itertools import cycle, islice
+from typing import Union
+import atexit
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils import TTLCache, cache_key
 
-# Safety check for RAG utils
+logger = logging.getLogger(__name__)
+
+# Optional Rust-backed CommonMark parser for response formatting
+try:
+    import pyromark
+except ImportError:
+    pyromark = None
+
+# Optional fast JSON parser for model responses
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional C Aho-Corasick automaton for the emoji pass
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional C decoder that parses and validates quiz batches in one step
 try:
-    from rag_utils import RAGKnowledgeBase
+    import msgspec
 except ImportError:
-    print("⚠️ Warning: rag_utils.py not found. Using dummy RAG system.")
-    class RAGKnowledgeBase:
-        def get_context_for_query(self, query): return ""
+    msgspec = None
+
+if msgspec is not None:
+    class QuizQuestion(msgspec.Struct):
+        question: str
+        options: list[str]
+        correct: int
+        explanation: str = ''
+
+    class QuizBatchEntry(msgspec.Struct):
+        id: Union[str, int]
+        questions: list[QuizQuestion]
+
+    class QuizBatch(msgspec.Struct):
+        batch: list[QuizBatchEntry] = []
+
+    _QUIZ_BATCH_DECODER = msgspec.json.Decoder(QuizBatch)
+
+# Stand-ins used when rag_utils is missing. google-genai and rag_utils are imported
+# on first GeminiAI() so importing this module (e.g. for the formatter) stays cheap.
+class _DummyRAGKnowledgeBase:
+    def get_context_for_query(self, query): return ""
+    def get_context_for_queries(self, queries): return dict.fromkeys(queries, "")
+
+class _DummySemanticCache:
+    def lookup(self, text, namespace="default"): return None, None
+    def add(self, text, response, namespace="default", embedding=None, ttl=None): pass
 
 load_dotenv()
 
+# Raw model responses are cached by a hash of model + prompt so repeated
+# doubts, explanations and plans skip the Gemini round-trip
+AI_CACHE_MAX_ENTRIES = 1024
+CHAT_CACHE_TTL = 3600  # 1 hour
+DOUBT_CACHE_TTL = 6 * 3600  # 6 hours
+STUDY_PLAN_CACHE_TTL = 6 * 3600  # 6 hours
+EXPLANATION_CACHE_TTL = 24 * 3600  # 24 hours
+MOTIVATION_CACHE_TTL = 3600  # 1 hour
+# Quizzes skip the exact-prompt cache and reuse a semantically matching quiz only
+# briefly, so a student retaking a topic soon after still gets new questions
+QUIZ_SEMANTIC_CACHE_TTL = 10 * 60  # 10 minutes
+
+# A quiz review explains its questions in parallel on a thread pool; answers not
+# back within the timeout (kept under app.AI_CALL_TIMEOUT) get the fallback text
+EXPLANATION_BATCH_WORKERS = 8
+EXPLANATION_BATCH_TIMEOUT = 25  # seconds
+
+# Set IGNORE_AI_CACHE=1 to always call the model (e.g. while tuning prompts)
+IGNORE_AI_CACHE = os.getenv('IGNORE_AI_CACHE', '').lower() in ('1', 'true', 'yes')
+
+_response_cache = TTLCache(maxsize=AI_CACHE_MAX_ENTRIES)
+
+# Near-duplicate requests (see _safe_call's semantic_key) persist here between runs
+SEMANTIC_CACHE_PATH = 'data/semantic_cache.pkl'
+
+# Visual Instruction for diagrams (Must be inside quotes!)
+VISUAL_INSTRUCTION = (
+    "If a physics concept can be visually represented (e.g., ray diagrams, circuit diagrams, magnetic field lines), "
+    "insert a tag in the format '' at the relevant spot. "
+    "Example: [Image of ray diagram for concave mirror object at C]. "
+    "Do not use markdown images, just this text tag."
+)
+
+# Static instructions shared by chat, doubts and study plans. They are sent once
+# through Gemini context caching when the model accepts it, otherwise as the
+# system instruction, which keeps a stable prefix for implicit caching.
+TUTOR_PREAMBLE = (
+    "You are an expert Class 10 Physics tutor for Indian CBSE students, following the NCERT syllabus. "
+    "Be accurate, encouraging and student-friendly, use proper physics terminology and SI units, "
+    "and format answers in markdown.\n\n" + VISUAL_INSTRUCTION
+)
+CONTEXT_CACHE_TTL = 3600  # seconds
+
+# RAG contexts for the fixed Class 10 topics are retrieved once at startup;
+# quiz and study plan requests for these topics then reuse them
+CLASS10_TOPICS = [
+    "Light - Reflection and Refraction",
+    "The Human Eye and the Colourful World",
+    "Electricity",
+    "Magnetic Effects of Electric Current",
+]
+TOPIC_CONTEXT_CACHE_MAX = 256
+
+# Patterns used by _format_response_with_markdown, compiled once at import
+_H3_RE = re.compile(r'### (.*)')
+_H2_RE = re.compile(r'## (.*)')
+_H1_RE = re.compile(r'# (.*)')
+_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+_ITALIC_RE = re.compile(r'\*(.*?)\*')
+_BULLET_LINE_RE = re.compile(r'[ ]*[-*][ ]+(.*)')
+_FORMULA_RE = re.compile(r'([A-Z])\s*=\s*([^,\n<]+)')
+# A block runs to the next blank line, the next block label or the end of the text
+_BLOCK_RE = re.compile(r'(?P<kind>Note|Definition|Example):(?P<body>.*?)(?=\n\n|Note:|Definition:|Example:|$)', re.DOTALL)
+_BLOCK_TEMPLATES = {
+    'Note': '<div class="important-note">💡 {}</div>',
+    'Definition': '<div class="definition-block"><strong>Definition:</strong>{}</div>',
+    'Example': '<div class="example-block"><strong>Example:</strong>{}</div>',
+}
+
+# Physics emoji mapping, applied with one fused alternation over the text
+_EMOJI_MAP = {
+    'light': '💡', 'mirror': '🪞', 'lens': '🔍', 'reflection': '✨',
+    'refraction': '🌈', 'electricity': '⚡', 'current': '🔌',
+    'magnetic': '🧲', 'energy': '⚡', 'power': '💪', 'work': '⚙️',
+    'force': '💥', 'motion': '🏃', 'velocity': '🚀', 'acceleration': '📈',
+    'voltage': '⚡', 'resistance': '🔒', 'circuit': '🔌', 'conductor': '📡',
+    'insulator': '🛡️', 'electromagnet': '🧲', 'generator': '⚡'
+}
+# Longest terms first so a term is never shadowed by a shorter one it starts with.
+# Tags are matched (and kept as-is) so terms inside attributes are left alone.
+_EMOJI_RE = re.compile(
+    r'<[^>]*>|\b(' + '|'.join(sorted(map(re.escape, _EMOJI_MAP), key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+
+if ahocorasick is not None:
+    _EMOJI_AUTOMATON = ahocorasick.Automaton()
+    for _term, _emoji in _EMOJI_MAP.items():
+        _EMOJI_AUTOMATON.add_word(_term, (len(_term), _emoji))
+    _EMOJI_AUTOMATON.make_automaton()
+
+def _emoji_span(match):
+    term = match.group(1)
+    if term is None:
+        return match.group(0)
+    return f'<span class="physics-emoji">{_EMOJI_MAP[term.lower()]}</span> {term}'
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+def _add_emojis(html_content):
+    """Prefix physics terms outside tags with their emoji in one linear scan"""
+    lowered = html_content.lower()
+    if ahocorasick is None or len(lowered) != len(html_content):
+        return _EMOJI_RE.sub(_emoji_span, html_content)
+    
+    # Leftmost-longest matches, kept only on word boundaries and outside tags (like _EMOJI_RE)
+    buf = io.StringIO()
+    last = 0
+    for end, (length, emoji) in _EMOJI_AUTOMATON.iter_long(lowered):
+        start = end - length + 1
+        if start > 0 and _is_word_char(html_content[start - 1]):
+            continue
+        if end + 1 < len(html_content) and _is_word_char(html_content[end + 1]):
+            continue
+        if html_content.rfind('<', 0, start) > html_content.rfind('>', 0, start):
+            continue
+        buf.write(html_content[last:start])
+        buf.write(f'<span class="physics-emoji">{emoji}</span> {html_content[start:end + 1]}')
+        last = end + 1
+    buf.write(html_content[last:])
+    return buf.getvalue()
+
+def _block_div(match):
+    return _BLOCK_TEMPLATES[match['kind']].format(match['body'])
+
+def _markdown_to_html_regex(text):
+    """Regex fallback for headers, emphasis, bullet lists and paragraphs"""
+    html_content = text
+    
+    # Format headers
+    html_content = _H3_RE.sub(r'<h3>\1</h3>', html_content)
+    html_content = _H2_RE.sub(r'<h2>\1</h2>', html_content)
+    html_content = _H1_RE.sub(r'<h1>\1</h1>', html_content)
+    
+    # Format bold and italic
+    html_content = _BOLD_RE.sub(r'<strong>\1</strong>', html_content)
+    html_content = _ITALIC_RE.sub(r'<em>\1</em>', html_content)
+    
+    return _blocks_to_html(html_content)
+
+def _blocks_to_html(text):
+    """Turn blank-line separated blocks into bullet lists and paragraphs in one pass over the lines"""
+    buf = io.StringIO()
+    block = []
+    bullets = []
+    
+    def flush():
+        if bullets:
+            # A block containing bullet points becomes a list of just those bullets
+            if buf.tell():
+                buf.write('\n')
+            buf.write('<ul class="concept-list">\n')
+            for item in bullets:
+                buf.write(f'<li>{item}</li>\n')
+            buf.write('</ul>')
+        elif block:
+            paragraph = '\n'.join(block)
+            if paragraph.strip():
+                if buf.tell():
+                    buf.write('\n')
+                if paragraph.startswith(('<h', '<ul', '<div')):
+                    buf.write(paragraph)
+                else:
+                    buf.write(f'<p>{paragraph}</p>')
+        block.clear()
+        bullets.clear()
+    
+    for line in text.split('\n'):
+        if not line:
+            flush()
+            continue
+        block.append(line)
+        bullet = _BULLET_LINE_RE.match(line)
+        if bullet:
+            bullets.append(bullet.group(1))
+    flush()
+    
+    return buf.getvalue()
+
+@lru_cache(maxsize=512)
+def _format_cached(text):
+    """Format physics content as HTML; repeated replies (fallbacks, common doubts) hit the cache"""
+    return f'<div class="physics-content">{_format_fragment(text)}</div>'
+
+def _format_fragment(text):
+    """Markdown-to-HTML pipeline shared by whole replies and streamed blocks"""
+    # Convert markdown to structured HTML: pyromark (Rust CommonMark) when
+    # installed, the regex passes otherwise
+    if pyromark is not None:
+        html_content = pyromark.html(textwrap.dedent(text)).replace('<ul>', '<ul class="concept-list">')
+    else:
+        html_content = _markdown_to_html_regex(text)
+    
+    # Add emojis for physics terms (one scan for all terms)
+    html_content = _add_emojis(html_content)
+    
+    # Format formulas
+    html_content = _FORMULA_RE.sub(r'<code>\1 = \2</code>', html_content)
+    
+    # Wrap notes, definitions and examples in one scan
+    html_content = _BLOCK_RE.sub(_block_div, html_content)
+    
+    return html_content
+
+class _IncrementalFormatter:
+    """Formats a streamed reply block by block as blank-line boundaries arrive"""
+    
+    def __init__(self):
+        self._pending = ''
+    
+    def feed(self, text):
+        """Add streamed text; return HTML for any blocks now complete (or '')"""
+        self._pending += text
+        cut = self._pending.rfind('\n\n')
+        # Never cut inside a ``` code fence
+        while cut != -1 and self._pending.count('```', 0, cut) % 2:
+            cut = self._pending.rfind('\n\n', 0, cut)
+        if cut == -1:
+            return ''
+        ready, self._pending = self._pending[:cut], self._pending[cut + 2:]
+        return _format_fragment(ready) if ready.strip() else ''
+    
+    def flush(self):
+        """Return HTML for whatever is left once the stream ends"""
+        ready, self._pending = self._pending, ''
+        return _format_fragment(ready) if ready.strip() else ''
+
+def _extract_json(text, open_char='['):
+    """Return the first balanced JSON array (or object) in text, or None
+    
+    Walks the text once tracking bracket depth, skipping brackets inside
+    quoted strings, instead of a greedy backtracking regex.
+    """
+    close_char = ']' if open_char == '[' else '}'
+    start = text.find(open_char)
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == open_char:
+            depth += 1
+        elif ch == close_char:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+def _loads_json(payload):
+    """Parse JSON with orjson when available"""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+# Built-in Class 10 Physics questions, used when the model is unavailable
+FALLBACK_PHYSICS_QUESTIONS = [
+    {
+        'question': 'What is the SI unit of electric current?',
+        'options': ['Volt (V)', 'Ampere (A)', 'Ohm (Ω)', 'Watt (W)'],
+        'correct': 1,
+        'explanation': 'Ampere (A) is the SI unit of electric current, representing 1 coulomb of charge per second.'
+    },
+    {
+        'question': 'Which type of mirror is used in car headlights?',
+        'options': ['Plane mirror', 'Concave mirror', 'Convex mirror', 'Cylindrical mirror'],
+        'correct': 1,
+        'explanation': 'Concave mirrors are used in headlights as they produce parallel beams of light when the bulb is at the focus.'
+    },
+    {
+        'question': 'What is the power of a lens having focal length of 50 cm?',
+        'options': ['+2 D', '-2 D', '+0.5 D', '+5 D'],
+        'correct': 0,
+        'explanation': 'Power P = 1/f (in meters) = 1/0.5 = +2 D. Convex lens has positive power.'
+    },
+    {
+        'question': 'According to Ohm\'s law, if voltage doubles and resistance remains constant, current will:',
+        'options': ['Remain same', 'Double', 'Become half', 'Become four times'],
+        'correct': 1,
+        'explanation': 'From V = IR, if V doubles and R is constant, then I also doubles to maintain the relationship.'
+    },
+    {
+        'question': 'The phenomenon of electromagnetic induction was discovered by:',
+        'options': ['Newton', 'Faraday', 'Ohm', 'Ampere'],
+        'correct': 1,
+        'explanation': 'Michael Faraday discovered electromagnetic induction in 1831.'
+    },
+    {
+        'question': 'In series combination of resistors, which quantity remains same?',
+        'options': ['Voltage', 'Current', 'Resistance', 'Power'],
+        'correct': 1,
+        'explanation': 'In series combination, current remains same through all resistors as there is only one path.'
+    },
+    {
+        'question': 'The angle of incidence is equal to angle of reflection. This is:',
+        'options': ['First law of reflection', 'Second law of reflection', 'Snell\'s law', 'Lens formula'],
+        'correct': 1,
+        'explanation': 'The second law of reflection states that angle of incidence equals angle of reflection.'
+    },
+    {
+        'question': 'What happens to the resistance of a conductor when temperature increases?',
+        'options': ['Increases', 'Decreases', 'Remains same', 'Becomes zero'],
+        'correct': 0,
+        'explanation': 'For metallic conductors, resistance increases with increase in temperature due to increased atomic vibrations.'
+    },
+    {
+        'question': 'The refractive index of water is 1.33. This means light in water travels at:',
+        'options': ['Same speed as in air', '1.33 times faster than in air', '1.33 times slower than in air', 'Infinite speed'],
+        'correct': 2,
+        'explanation': 'Refractive index n = c/v, where c is speed in vacuum and v is speed in medium. Higher n means slower speed.'
+    },
+    {
+        'question': 'Electric power consumed by a device is measured in:',
+        'options': ['Volt', 'Ampere', 'Watt', 'Ohm'],
+        'correct': 2,
+        'explanation': 'Power is measured in Watts (W). Power P = VI = I²R = V²/R.'
+    }
+]
+
+# Fallback question ids per whitespace token of question + explanation. A topic
+# keyword (no whitespace) is a substring of a question exactly when it is a
+# substring of one of its tokens, so lookups match the old substring scan.
+_FALLBACK_TOPIC_INDEX = defaultdict(set)
+for _i, _q in enumerate(FALLBACK_PHYSICS_QUESTIONS):
+    for _token in (_q['question'].lower() + ' ' + _q['explanation'].lower()).split():
+        _FALLBACK_TOPIC_INDEX[_token].add(_i)
+del _i, _q, _token
+
+@lru_cache(maxsize=256)
+def _fallback_ids_for_keyword(keyword):
+    return frozenset().union(*(ids for token, ids in _FALLBACK_TOPIC_INDEX.items() if keyword in token))
+
+# Focus-area wording per 20-point score bucket: 0-19, 20-39, 40-59, 60-79, 80+
+_FA_TEMPLATES = (
+    "🔴 **{}**: Urgent attention needed! (Score: {:.1f}%) - Review basic concepts daily",
+    "🔴 **{}**: Urgent attention needed! (Score: {:.1f}%) - Review basic concepts daily",
+    "🟡 **{}**: Need more practice (Score: {:.1f}%) - Focus on numerical problems",
+    "🟢 **{}**: Good progress! (Score: {:.1f}%) - Polish advanced topics",
+    "⭐ **{}**: Excellent work! (Score: {:.1f}%) - Try challenging problems",
+)
+_FA_RECOMMENDATION = "📚 **Recommendation**: Revise NCERT examples and practice more numericals"
+_FA_FIRST_QUIZ = (
+    "🎯 Take your first Physics quiz to get personalized recommendations!",
+    "💡 Start with Light - Reflection and Refraction chapter",
+    "⚡ Practice basic Electricity concepts and Ohm's law",
+    "🧲 Explore Magnetic Effects of Electric Current",
+)
+_FA_ERROR = (
+    "🎯 Continue regular physics practice across all chapters",
+    "💡 Focus on understanding concepts before memorizing formulas",
+    "⚡ Practice numerical problems daily",
+    "🧲 Connect physics concepts to real-world applications",
+)
+
+@lru_cache(maxsize=256)
+def _focus_areas_for(quiz_performance):
+    """Focus-area lines for a tuple of (subject, avg_score, quiz_count) rows"""
+    focus_areas = []
+    has_weak = False
+    for subject, avg_score, quiz_count in quiz_performance:
+        bucket = min(max(int(avg_score) // 20, 0), 4)
+        focus_areas.append(_FA_TEMPLATES[bucket].format(subject, avg_score))
+        if avg_score < 60:
+            has_weak = True
+    
+    # Add specific physics recommendations
+    if has_weak:
+        focus_areas.append(_FA_RECOMMENDATION)
+    
+    return tuple(focus_areas[:5])
+
+# Replies shown when a model call fails, filled in with format_map where needed
+_ERR_CHAT = """
+        💬 I'm having trouble processing that right now.
+        
+        Could you:
+        1. Rephrase your question, or
+        2. Try asking about a specific physics topic?
+        
+        I'm here to help with:
+        - 💡 Physics concepts
+        - 📝 Problem solving
+        - 🔬 Experiments and applications
+        - 📚 Study guidance
+        
+        Let's try again! 🚀
+        """
+
+_ERR_DOUBT_TEMPLATE = """
+        ## 🤔 **I'm having trouble answering that right now!**
+        
+        **Possible reasons:**
+        - ❌ Internet connection issues
+        - 🔧 Technical problem: {error}
+        
+        ## 💡 **Let's try this instead:**
+        
+        **1. 🔄 Rephrase your question** - Make it more specific
+        **2. 📶 Check internet connection** - Ensure stable connection  
+        **3. 🎯 Ask about specific topics** - Try these examples:
+        
+        ### 📚 **Example Questions I Can Help With:**
+        - **💡 Light**: "Explain laws of reflection" or "How do concave mirrors work?"
+        - **⚡ Electricity**: "What is Ohm's law?" or "How to calculate resistance?"
+        - **🧲 Magnetism**: "Right hand thumb rule" or "Electromagnetic induction"
+        - **🧮 Numerical**: "Mirror formula problem" or "Power calculation"
+        
+        ### 🚀 **I'm your Class 10 Physics expert!**
+        **Ask me anything about:**
+        - Light, mirrors, lenses 💡
+        - Electricity, current, circuits ⚡
+        - Magnetism and induction 🧲
+        - Formulas and numerical problems 🧮
+        
+        **💪 Don't give up - physics is amazing once you get it!** 🌟
+        """
+
+_ERR_EXPLANATION_TEMPLATE = """
+        ### ❌ **Oops! Technical Difficulty**
+        
+        I'm having trouble generating a detailed explanation right now.
+        
+        ### 💡 **Quick Explanation:**
+        The correct answer is: **{correct_answer}**
+        
+        ### 🎯 **Study Tips:**
+        - Review {chapter} chapter in your NCERT textbook
+        - Practice similar problems
+        - Ask your teacher for clarification
+        
+        ### 🚀 **Keep Going!**
+        Don't worry! Physics becomes clearer with practice. Keep exploring!
+        """
+
+# Shown when study plan generation fails (formatted once, after the GeminiAI class)
+FALLBACK_STUDY_PLAN = """
+# 🚀 **7-Day Class 10 Physics Mastery Plan**
+
+*Master the fundamental concepts that govern our universe!*
+
+## 📅 **Daily Study Schedule**
+
+### **Day 1: 💡 Light - Reflection & Mirrors**
+- **🎯 Focus**: Understanding light behavior and mirror concepts
+- **📖 Topics**: 
+  - Laws of reflection
+  - Plane mirrors and image formation
+  - Spherical mirrors (concave & convex)
+  - Mirror formula: 1/v + 1/u = 1/f
+- **🧮 Practice**: Solve 8-10 numerical problems on mirrors
+- **🎬 Resources**: Search "Class 10 Physics Light Reflection NCERT" on YouTube
+- **⏰ Time**: 60-75 minutes
+- **✅ Goal**: Master mirror formula applications
+
+### **Day 2: 🌈 Refraction & Lenses**
+- **🎯 Focus**: Light bending and lens behavior
+- **📖 Topics**:
+  - Laws of refraction and Snell's law
+  - Refractive index concepts
+  - Convex and concave lenses
+  - Lens formula: 1/v - 1/u = 1/f
+- **🧮 Practice**: Lens power calculations and image formation
+- **🎬 Resources**: "Class 10 Physics Refraction Lenses"
+- **⏰ Time**: 60-75 minutes
+- **✅ Goal**: Understand lens applications
+
+### **Day 3: ⚡ Electricity Basics**
+- **🎯 Focus**: Electric current and potential difference
+- **📖 Topics**:
+  - Electric current and conventional flow
+  - Potential difference and voltage
+  - Ohm's Law: V = I × R
+  - Factors affecting resistance
+- **🧮 Practice**: Current, voltage, resistance calculations
+- **🎬 Resources**: "Class 10 Physics Electricity Ohm's Law"
+- **⏰ Time**: 60-75 minutes
+- **✅ Goal**: Apply Ohm's law confidently
+
+### **Day 4: 🔌 Resistors & Circuits**
+- **🎯 Focus**: Circuit analysis and combinations
+- **📖 Topics**:
+  - Series combination: Rs = R₁ + R₂ + R₃
+  - Parallel combination: 1/Rp = 1/R₁ + 1/R₂
+  - Mixed circuits and problem solving
+- **🧮 Practice**: Complex circuit problems
+- **🎬 Resources**: "Class 10 Physics Resistor Combinations"
+- **⏰ Time**: 60-75 minutes
+- **✅ Goal**: Solve any resistor network
+
+### **Day 5: 💪 Electric Power & Energy**
+- **🎯 Focus**: Power consumption and energy bills
+- **📖 Topics**:
+  - Electric power: P = VI = I²R = V²/R
+  - Electric energy and commercial units
+  - kWh calculations and electricity bills
+  - Heating effects of current
+- **🧮 Practice**: Power and energy numerical problems
+- **🎬 Resources**: "Class 10 Physics Electric Power Energy"
+- **⏰ Time**: 60-75 minutes
+- **✅ Goal**: Calculate electricity costs
+
+### **Day 6: 🧲 Magnetic Effects**
+- **🎯 Focus**: Magnetism and current relationship
+- **📖 Topics**:
+  - Magnetic field around current-carrying conductors
+  - Right-hand thumb rule
+  - Magnetic field due to solenoid
+  - Force on current-carrying conductor
+  - Fleming's left-hand rule
+- **🧮 Practice**: Magnetic field direction problems
+- **🎬 Resources**: "Class 10 Physics Magnetic Effects Current"
+- **⏰ Time**: 60-75 minutes
+- **✅ Goal**: Master hand rules
+
+### **Day 7: 📝 Revision & Integration**
+- **🎯 Focus**: Complete review and exam preparation
+- **📖 Topics**: All covered concepts with formula sheet
+- **🧮 Practice**: 
+  - Mixed problems from all chapters
+  - Sample question paper (3 hours)
+  - Previous year questions
+- **🎬 Resources**: "Class 10 Physics Complete Revision"
+- **⏰ Time**: 90-120 minutes
+- **✅ Goal**: Exam readiness achieved
+
+## 📈 **Weekly Learning Objectives**
+1. **🎯** Master all fundamental physics formulas
+2. **🧮** Solve 50+ numerical problems confidently  
+3. **📝** Complete detailed chapter notes
+4. **🎬** Watch 10+ educational physics videos
+5. **🧪** Understand real-world physics applications
+
+## 🧪 **Daily Practice Strategy**
+- **Morning**: Theory reading (20 mins)
+- **Afternoon**: Problem solving (30 mins)
+- **Evening**: Video watching (15 mins)
+- **Night**: Quick revision (10 mins)
+
+## 💡 **Physics Mastery Tips**
+- **📊** Draw diagrams for every concept
+- **🔢** Practice numerical problems daily
+- **🎯** Focus on NCERT examples first
+- **💭** Connect physics to daily life
+- **🤔** Ask "why" for every formula
+
+## 📝 **Assessment Checkpoints**
+- **Daily**: 5-question mini quiz
+- **Alternate days**: One complete numerical problem
+- **Weekend**: Chapter-wise test
+- **Final**: Mock exam with time limits
+
+---
+**🌟 Remember**: *Physics is not just about memorizing formulas - it's about understanding how our universe works! Every concept you learn brings you closer to becoming a real scientist.* **You've got this!** 💪🚀
+
+**📞 Keep practicing, stay curious, and let physics amaze you every day!** ⚡
+"""
+
+def _parse_quiz_batch(payload):
+    """Map request id -> question dicts from a {"batch": [...]} JSON payload"""
+    if msgspec is not None:
+        try:
+            parsed = _QUIZ_BATCH_DECODER.decode(payload)
+            return {
+                str(entry.id): [msgspec.structs.asdict(q) for q in entry.questions if len(q.options) == 4]
+                for entry in parsed.batch
+            }
+        except msgspec.ValidationError:
+            # Some entry is off-schema: fall back to the lenient per-question checks
+            pass
+    
+    parsed = _loads_json(payload)
+    batch = {}
+    for entry in parsed.get('batch', []) if isinstance(parsed, dict) else []:
+        if isinstance(entry, dict) and isinstance(entry.get('questions'), list):
+            batch[str(entry.get('id'))] = [
+                q for q in entry['questions']
+                if isinstance(q, dict) and all(key in q for key in ['question', 'options', 'correct']) and len(q['options']) == 4
+            ]
+    return batch
+
 class GeminiAI:
+    # Fallback motivation quotes; only the chosen one is formatted with the student's name
+    _PHYSICS_QUOTE_TEMPLATES = (
+        "🌟 **Fantastic work, {name}!** Just like light travels at 3×10⁸ m/s, your physics knowledge is expanding at incredible speed! Keep exploring the universe! 🚀💡",
+        "⚡ **{name}, you're electrifying!** Remember, Einstein once said imagination is more important than knowledge. Your curiosity today shapes tomorrow's discoveries! 🧠🌌",
+        "🚀 **Keep it up, {name}!** From Newton's apple 🍎 to Einstein's relativity, every great physicist started with questions just like yours. You're on the path to greatness! 🎯",
+        "💪 **{name}, stay charged up!** Just like energy can neither be created nor destroyed, your effort in learning physics will always transform into success! ⚡📈",
+        "🎯 **Focus mode activated, {name}!** Every formula you master is like unlocking a secret of the universe. From Ohm's law to electromagnetic induction - you're becoming a real scientist! 🧪🔬",
+        "🌟 **Brilliant work, {name}!** Physics is everywhere - in your smartphone 📱, the sunset 🌅, and even in your heartbeat ❤️. You're learning to decode the language of nature! 🌍"
+    )
+
     def __init__(self):
         """Initialize Gemini AI with API key and RAG system"""
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
-            print("⚠️ Warning: GEMINI_API_KEY not found in environment variables")
+            logger.warning("⚠️ Warning: GEMINI_API_KEY not found in environment variables")
         
         # Initialize the new Client (replaces genai.configure)
         try:
+            from google import genai
+            from google.genai import types
+            self._types = types
             self.client = genai.Client(api_key=api_key)
-            print("🛑 DEBUG CHECK: I am reading the NEW code!")
+            self.aclient = self.client.aio
             self.model_name = 'gemini-2.5-flash'
-            print(f"✅ Gemini Client connected using {self.model_name}")
+            logger.info(f"✅ Gemini Client connected using {self.model_name}")
         except Exception as e:
-            print(f"❌ Gemini Connection failed: {e}")
+            logger.error(f"❌ Gemini Connection failed: {e}")
             self.client = None
+            self.aclient = None
         
-        # Initialize RAG system
+        # Safety check for RAG utils
         try:
-            self.rag = RAGKnowledgeBase()
-            print("✅ RAG Knowledge Base initialized for Class 10 Physics")
-        except Exception as e:
-            print(f"⚠️ RAG initialization error: {e}")
-            self.rag = None
-
-        # Visual Instruction for diagrams (Must be inside quotes!)
-        self.visual_instruction = (
-            "If a physics concept can be visually represented (e.g., ray diagrams, circuit diagrams, magnetic field lines), "
-            "insert a tag in the format '' at the relevant spot. "
-            "Example: [Image of ray diagram for concave mirror object at C]. "
-            "Do not use markdown images, just this text tag."
-        )
+            from rag_utils import RAGKnowledgeBase, SemanticCache
+        except ImportError:
+            logger.warning("⚠️ Warning: rag_utils.py not found. Using dummy RAG system.")
+            RAGKnowledgeBase, SemanticCache = _DummyRAGKnowledgeBase, _DummySemanticCache
+        
+        # The RAG knowledge base is loaded on first use (see the rag property)
+        self._rag_class = RAGKnowledgeBase
+        self._rag_lock = threading.Lock()
+
+        # Async callers format responses here so the (GIL-releasing) pyromark
+        # parse of several replies can run in parallel
+        self._fmt_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='formatter')
+        # Sync model calls for batched explanations; the async client is left to
+        # async callers, since its connection pool belongs to one event loop
+        self._call_pool = ThreadPoolExecutor(max_workers=EXPLANATION_BATCH_WORKERS, thread_name_prefix='gemini-batch')
+        
+        self._ctx_cache = {}
+        self._ctx_lock = threading.Lock()
+
+        # Near-duplicate doubts, chat openers, quizzes and plans reuse earlier answers
+        self.semantic_cache = SemanticCache()
+        if hasattr(self.semantic_cache, 'save'):
+            self.semantic_cache.load(SEMANTIC_CACHE_PATH)
+            atexit.register(self.semantic_cache.save, SEMANTIC_CACHE_PATH)
+            # Load the embedding model now, off the request path
+            self.semantic_cache.warm_up()
+
+        self.visual_instruction = VISUAL_INSTRUCTION
+        
+        # Finished motivation messages and explanations keyed by their (bucketed)
+        # inputs, so repeat requests skip retrieval, prompt building and formatting
+        self._motivation_cache = TTLCache(maxsize=AI_CACHE_MAX_ENTRIES, ttl=MOTIVATION_CACHE_TTL)
+        self._explanation_cache = TTLCache(maxsize=AI_CACHE_MAX_ENTRIES, ttl=EXPLANATION_CACHE_TTL)
+        
+        # Gemini context cache holding TUTOR_PREAMBLE, created on first use
+        self._preamble_cache_name = None
+        self._preamble_cache_expires = 0
+        self._preamble_cache_failed = False
+        self._preamble_lock = threading.Lock()
+    
+    def _preamble_config(self):
+        """Generation config that supplies TUTOR_PREAMBLE, from the context cache when possible"""
+        with self._preamble_lock:
+            if self._preamble_cache_name and time.time() < self._preamble_cache_expires:
+                return self._types.GenerateContentConfig(cached_content=self._preamble_cache_name)
+            if not self._preamble_cache_failed:
+                try:
+                    cache = self.client.caches.create(
+                        model=self.model_name,
+                        config=self._types.CreateCachedContentConfig(
+                            system_instruction=TUTOR_PREAMBLE,
+                            ttl=f"{CONTEXT_CACHE_TTL}s"
+                        )
+                    )
+                    self._preamble_cache_name = cache.name
+                    # Refresh a minute early so requests never reference an expired cache
+                    self._preamble_cache_expires = time.time() + CONTEXT_CACHE_TTL - 60
+                    return self._types.GenerateContentConfig(cached_content=cache.name)
+                except Exception as e:
+                    # Typically the preamble is below the model's minimum cacheable size
+                    logger.warning(f"⚠️ Context caching unavailable, sending preamble inline: {e}")
+                    self._preamble_cache_failed = True
+        return self._types.GenerateContentConfig(system_instruction=TUTOR_PREAMBLE)
+    
+    @cached_property
+    def rag(self):
+        """RAG knowledge base, loaded on first use (None if it could not be loaded)"""
+        with self._rag_lock:
+            if 'rag' in self.__dict__:
+                return self.__dict__['rag']
+            try:
+                rag = self._rag_class()
+                logger.info("✅ RAG Knowledge Base initialized for Class 10 Physics")
+            except Exception as e:
+                logger.warning(f"⚠️ RAG initialization error: {e}")
+                rag = None
+            
+            # Warm the topic contexts that quiz and study plan prompts ask for
+            if rag:
+                for topic in CLASS10_TOPICS:
+                    for query in (topic, f"Class 10 Physics {topic} chapter concepts formulas"):
+                        self._ctx_cache[query] = rag.get_context_for_query(query)
+                for query in ("Class 10 Physics concepts", "Class 10 Physics chapters syllabus"):
+                    self._ctx_cache[query] = rag.get_context_for_query(query)
+            
+            # Set inside the lock so a concurrent first access sees it
+            self.__dict__['rag'] = rag
+            return rag
+    
+    def _topic_context(self, query):
+        """RAG context for a quiz or study plan topic, memoized per query"""
+        if not self.rag:
+            return ""
+        context = self._ctx_cache.get(query)
+        if context is None:
+            context = self.rag.get_context_for_query(query)
+            with self._ctx_lock:
+                if len(self._ctx_cache) < TOPIC_CONTEXT_CACHE_MAX:
+                    self._ctx_cache.setdefault(query, context)
+        return context
+    
+    # Short digest of a request's inputs for the per-method caches
+    _input_key = staticmethod(cache_key)
+    
+    def _cache_key(self, prompt):
+        """Response cache key for a prompt sent to the current model"""
+        return cache_key(self.model_name, prompt)
     
-    def _safe_call(self, prompt):
-        """Safe wrapper for Gemini API calls using the new SDK"""
+    def _safe_call(self, prompt, cache_ttl=None, semantic_key=None, semantic_namespace="default", preamble=False,
+                   semantic_ttl=None):
+        """Safe wrapper for Gemini API calls using the new SDK
+        
+        cache_ttl caches the response for the exact prompt. semantic_key is a short
+        description of the request (not the full prompt, whose template text would
+        make every prompt look alike) used to reuse answers to near-identical requests,
+        for semantic_ttl seconds if given (else the semantic cache's own TTL).
+        preamble sends TUTOR_PREAMBLE ahead of the prompt.
+        """
         if not self.client:
             raise ValueError("Gemini Client not initialized")
+        
+        cached, cache_key, embedding = self._cached_reply(prompt, cache_ttl, semantic_key, semantic_namespace)
+        if cached is not None:
+            return cached
             
         try:
             # New generate syntax for google-genai library
             response = self.client.models.generate_content(
                 model=self.model_name,
-                contents=prompt
+                contents=prompt,
+                config=self._preamble_config() if preamble else None
             )
-            return response.text
         except Exception as e:
-            print(f'[Gemini-ERROR] {e}')
+            logger.error(f'[Gemini-ERROR] {e}')
             raise
+        
+        text = response.text
+        self._store_reply(text, cache_key, cache_ttl, semantic_key, semantic_namespace, embedding, semantic_ttl)
+        return text
     
-    def _format_response_with_markdown(self, text: str) -> str:
-        """Format physics content with proper HTML structure and styling"""
-        if not text: return ""
-
-        # Physics emoji mapping
-        emoji_map = {
-            'light': '💡', 'mirror': '🪞', 'lens': '🔍', 'reflection': '✨',
-            'refraction': '🌈', 'electricity': '⚡', 'current': '🔌',
-            'magnetic': '🧲', 'energy': '⚡', 'power': '💪', 'work': '⚙️',
-            'force': '💥', 'motion': '🏃', 'velocity': '🚀', 'acceleration': '📈',
-            'voltage': '⚡', 'resistance': '🔒', 'circuit': '🔌', 'conductor': '📡',
-            'insulator': '🛡️', 'electromagnet': '🧲', 'generator': '⚡'
-        }
-        
-        # Convert markdown to structured HTML
-        html_content = text
-        
-        # Format headers
-        html_content = re.sub(r'### (.*)', r'<h3>\1</h3>', html_content)
-        html_content = re.sub(r'## (.*)', r'<h2>\1</h2>', html_content)
-        html_content = re.sub(r'# (.*)', r'<h1>\1</h1>', html_content)
-        
-        # Format bold and italic
-        html_content = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', html_content)
-        html_content = re.sub(r'\*(.*?)\*', r'<em>\1</em>', html_content)
-        
-        # Convert bullet points to structured lists
-        bullet_pattern = r'(?:^|\n)[ ]*[-*][ ]+(.*?)(?=\n|$)'
-        if re.search(bullet_pattern, html_content, re.MULTILINE):
-            # Find all bullet point sections
-            sections = re.split(r'\n\n+', html_content)
-            formatted_sections = []
-            
-            for section in sections:
-                if re.search(bullet_pattern, section, re.MULTILINE):
-                    # This section contains bullet points
-                    bullets = re.findall(bullet_pattern, section, re.MULTILINE)
-                    bullet_list = '\n'.join([f'<li>{item}</li>' for item in bullets])
-                    formatted_sections.append(f'<ul class="concept-list">\n{bullet_list}\n</ul>')
-                else:
-                    formatted_sections.append(section)
-            
-            html_content = '\n\n'.join(formatted_sections)
-        
-        # Format paragraphs
-        paragraphs = html_content.split('\n\n')
-        formatted_paragraphs = []
-        for p in paragraphs:
-            if not p.strip():
-                continue
-            if not (p.startswith('<h') or p.startswith('<ul') or p.startswith('<div')):
-                formatted_paragraphs.append(f'<p>{p}</p>')
-            else:
-                formatted_paragraphs.append(p)
-        html_content = '\n'.join(formatted_paragraphs)
+    async def _asafe_call(self, prompt, cache_ttl=None, semantic_key=None, semantic_namespace="default", preamble=False,
+                          semantic_ttl=None):
+        """Async variant of _safe_call using the google-genai async client"""
+        if not self.aclient:
+            raise ValueError("Gemini Client not initialized")
         
-        # Add emojis for physics terms
-        for term, emoji in emoji_map.items():
-            pattern = r'\b' + re.escape(term) + r'\b'
-            html_content = re.sub(pattern, f'<span class="physics-emoji">{emoji}</span> {term}', html_content, flags=re.IGNORECASE)
+        # Embedding a semantic_key is CPU-bound model work; keep it off the event loop
+        if semantic_key:
+            cached, cache_key, embedding = await asyncio.to_thread(
+                self._cached_reply, prompt, cache_ttl, semantic_key, semantic_namespace)
+        else:
+            cached, cache_key, embedding = self._cached_reply(prompt, cache_ttl, semantic_key, semantic_namespace)
+        if cached is not None:
+            return cached
         
-        # Format formulas
-        formula_pattern = r'([A-Z])\s*=\s*([^,\n<]+)'
-        html_content = re.sub(formula_pattern, r'<code>\1 = \2</code>', html_content)
+        try:
+            # The preamble cache may need a (blocking) caches.create on first use
+            config = await asyncio.to_thread(self._preamble_config) if preamble else None
+            response = await self.aclient.models.generate_content(
+                model=self.model_name,
+                contents=prompt,
+                config=config
+            )
+        except Exception as e:
+            logger.error(f'[Gemini-ERROR] {e}')
+            raise
+        
+        text = response.text
+        if semantic_key:
+            await asyncio.to_thread(self._store_reply, text, cache_key, cache_ttl, semantic_key,
+                                    semantic_namespace, embedding, semantic_ttl)
+        else:
+            self._store_reply(text, cache_key, cache_ttl, semantic_key, semantic_namespace, embedding, semantic_ttl)
+        return text
+    
+    def _cached_reply(self, prompt, cache_ttl, semantic_key, semantic_namespace):
+        """Look a request up in the response and semantic caches
         
-        # Wrap important notes
-        if "Note:" in html_content:
-            html_content = re.sub(r'Note:(.*?)(?=\n\n|$)', r'<div class="important-note">💡 \1</div>', html_content, flags=re.DOTALL)
+        Returns (cached_text_or_None, response_cache_key, embedding) for _store_reply.
+        """
+        cache_key = None
+        if cache_ttl and not IGNORE_AI_CACHE:
+            cache_key = self._cache_key(prompt)
+            cached = _response_cache.get(cache_key)
+            if cached is not None:
+                return cached, cache_key, None
         
-        # Format definitions
-        if "Definition:" in html_content:
-            html_content = re.sub(r'Definition:(.*?)(?=\n\n|$)', r'<div class="definition-block"><strong>Definition:</strong>\1</div>', html_content, flags=re.DOTALL)
+        embedding = None
+        if semantic_key and not IGNORE_AI_CACHE:
+            cached, embedding = self.semantic_cache.lookup(semantic_key, semantic_namespace)
+            if cached is not None:
+                return cached, cache_key, embedding
+        return None, cache_key, embedding
+    
+    def _store_reply(self, text, cache_key, cache_ttl, semantic_key, semantic_namespace, embedding, semantic_ttl=None):
+        """Remember a fresh model reply in the caches _cached_reply consulted"""
+        if not text:
+            return
+        if cache_key:
+            _response_cache.set(cache_key, text, ttl=cache_ttl)
+        if semantic_key and not IGNORE_AI_CACHE:
+            self.semantic_cache.add(semantic_key, text, semantic_namespace, embedding, ttl=semantic_ttl)
+    
+    def _safe_stream(self, prompt, cache_ttl=None, preamble=False):
+        """Yield response text chunks as Gemini produces them, caching the full text"""
+        if not self.client:
+            raise ValueError("Gemini Client not initialized")
         
-        # Format examples
-        if "Example:" in html_content:
-            html_content = re.sub(r'Example:(.*?)(?=\n\n|$)', r'<div class="example-block"><strong>Example:</strong>\1</div>', html_content, flags=re.DOTALL)
+        use_cache = bool(cache_ttl) and not IGNORE_AI_CACHE
+        if use_cache:
+            cache_key = self._cache_key(prompt)
+            cached = _response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
         
-        return f'<div class="physics-content">{html_content}</div>'
+        parts = []
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model_name,
+                contents=prompt,
+                config=self._preamble_config() if preamble else None
+            ):
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield chunk.text
+        except Exception as e:
+            logger.error(f'[Gemini-ERROR] {e}')
+            raise
+        
+        text = ''.join(parts)
+        if use_cache and text:
+            _response_cache.set(cache_key, text, ttl=cache_ttl)
+    
+    def _stream_reply(self, prompt, cache_ttl, cache_text=None, namespace=None, embedding=None):
+        """Yield ('chunk', text) and ('html', block) events, then ('done', html) once the reply is complete
+        
+        'html' events carry each finished paragraph/list already formatted, so
+        clients can render progressively; 'done' carries the whole formatted reply.
+        """
+        parts = []
+        formatter = _IncrementalFormatter()
+        for text in self._safe_stream(prompt, cache_ttl=cache_ttl, preamble=True):
+            parts.append(text)
+            yield ('chunk', text)
+            block = formatter.feed(text)
+            if block:
+                yield ('html', block)
+        block = formatter.flush()
+        if block:
+            yield ('html', block)
+        formatted = self._format_response_with_markdown(''.join(parts))
+        if namespace:
+            self.semantic_cache.add(cache_text, formatted, namespace, embedding)
+        yield ('done', formatted)
+    
+    async def aformat_response(self, text: str) -> str:
+        """Async variant of _format_response_with_markdown that runs on the formatter pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._fmt_pool, self._format_response_with_markdown, text)
+    
+    @staticmethod
+    def _format_response_with_markdown(text: str) -> str:
+        """Format physics content with proper HTML structure and styling"""
+        if not text: return ""
+        return _format_cached(text)
     
     def generate_quiz_questions(self, subject="Physics", class_level=10, n=10, difficulty='medium', topic=None):
         """Generate RAG-enhanced quiz questions for Class 10 Physics"""
-        try:
-            # Get relevant context from RAG
-            search_query = topic if topic else f"Class {class_level} Physics concepts"
-            relevant_context = self.rag.get_context_for_query(search_query) if self.rag else ""
-            
-            topic_focus = f"Topic focus: {topic}" if topic else "General Class 10 Physics"
-            
-            prompt = f"""
-            Generate exactly {n} multiple choice questions for Class 10 Physics (CBSE curriculum).
-            {topic_focus}
-            Difficulty level: {difficulty}
-            
-            Use this knowledge context to create accurate questions:
-            {relevant_context}
-            
-            Return ONLY a valid JSON array with each question having:
-            - question: the question text (include proper physics units and symbols)
-            - options: array of exactly 4 options with units where applicable
-            - correct: index of correct answer (0-3)
-            - explanation: brief explanation of the correct answer with formula if applicable
-            
-            Example format:
-            [
+        request = {'id': 'quiz', 'n': n, 'difficulty': difficulty, 'topic': topic}
+        return self.generate_quiz_questions_batch([request], subject, class_level)['quiz']
+    
+    def _quiz_batch_request(self, requests, class_level):
+        """Prompt plus semantic cache key and namespace for a quiz batch"""
+        # Get relevant context from RAG, once per distinct topic
+        search_queries = [req.get('topic') or f"Class {class_level} Physics concepts" for req in requests]
+        relevant_context = "\n".join(self._topic_context(query) for query in dict.fromkeys(search_queries))
+        
+        sub_requests = "\n".join(
+            f"- id \"{req['id']}\": exactly {req.get('n', 10)} questions, "
+            f"{'Topic focus: ' + req['topic'] if req.get('topic') else 'General Class 10 Physics'}, "
+            f"Difficulty level: {req.get('difficulty', 'medium')}"
+            for req in requests
+        )
+        
+        prompt = f"""
+        Generate multiple choice questions for Class 10 Physics (CBSE curriculum) for each of these requests:
+        {sub_requests}
+        
+        Use this knowledge context to create accurate questions:
+        {relevant_context}
+        
+        Return ONLY a valid JSON object of the form {{"batch": [{{"id": ..., "questions": [...]}}, ...]}}
+        with one entry per request id. Each question has:
+        - question: the question text (include proper physics units and symbols)
+        - options: array of exactly 4 options with units where applicable
+        - correct: index of correct answer (0-3)
+        - explanation: brief explanation of the correct answer with formula if applicable
+        
+        Example format:
+        {{"batch": [
+            {{"id": "example", "questions": [
                 {{
                     "question": "What is the SI unit of electric current?",
                     "options": ["Volt (V)", "Ampere (A)", "Ohm (Ω)", "Watt (W)"],
                     "correct": 1,
                     "explanation": "Ampere (A) is the SI unit of electric current."
                 }}
-            ]
-            
-            Focus on:
-            - Light reflection, refraction, mirrors, lenses
-            - Electric current, voltage, resistance, Ohm's law
-            - Magnetic effects, electromagnetic induction
-            - Numerical problems with proper units
-            """
-            
-            response_text = self._safe_call(prompt)
-            
-            # Extract JSON from response
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
-                json_text = json_match.group()
-                questions = json.loads(json_text)
-                
-                if isinstance(questions, list) and len(questions) > 0:
-                    # Validate and clean questions
-                    valid_questions = []
-                    for q in questions:
-                        if all(key in q for key in ['question', 'options', 'correct']) and len(q['options']) == 4:
-                            valid_questions.append(q)
-                    
-                    if valid_questions:
-                        return valid_questions[:n]
-            
-            return self._fallback_physics_questions(n, topic)
-            
+            ]}}
+        ]}}
+        
+        Focus on:
+        - Light reflection, refraction, mirrors, lenses
+        - Electric current, voltage, resistance, Ohm's law
+        - Magnetic effects, electromagnetic induction
+        - Numerical problems with proper units
+        """
+        
+        semantic_key = "; ".join(search_queries)
+        namespace = f"quiz:{class_level}:" + ";".join(
+            f"{req['id']}:{req.get('difficulty', 'medium')}:{req.get('n', 10)}" for req in requests)
+        return prompt, semantic_key, namespace
+    
+    def _quiz_batch_results(self, requests, response_text):
+        """Parse a quiz batch reply into {id: questions}; a request the model missed gets fallback questions"""
+        batch = {}
+        if response_text:
+            try:
+                json_text = _extract_json(response_text, '{')
+                batch = _parse_quiz_batch(json_text) if json_text else {}
+            except Exception as e:
+                logger.error(f"Error parsing quiz questions: {e}")
+        
+        results = {}
+        for req in requests:
+            n = req.get('n', 10)
+            valid_questions = batch.get(str(req['id']))
+            results[req['id']] = valid_questions[:n] if valid_questions else self._fallback_physics_questions(n, req.get('topic'))
+        return results
+    
+    def generate_quiz_questions_batch(self, requests, subject="Physics", class_level=10):
+        """Generate several quizzes with a single API call
+        
+        requests is a list of dicts with 'id', 'n', 'difficulty' and an optional 'topic'.
+        Returns {id: questions}; a request the model misses gets fallback questions.
+        """
+        if not requests:
+            return {}
+        try:
+            prompt, semantic_key, namespace = self._quiz_batch_request(requests, class_level)
+            response_text = self._safe_call(prompt, semantic_key=semantic_key, semantic_namespace=namespace,
+                                            semantic_ttl=QUIZ_SEMANTIC_CACHE_TTL)
         except Exception as e:
-            print(f"Error generating RAG-enhanced quiz questions: {e}")
-            return self._fallback_physics_questions(n, topic)
+            logger.error(f"Error generating RAG-enhanced quiz questions: {e}")
+            response_text = None
+        return self._quiz_batch_results(requests, response_text)
+    
+    async def agenerate_quiz_questions_batch(self, requests, subject="Physics", class_level=10):
+        """Async variant of generate_quiz_questions_batch"""
+        if not requests:
+            return {}
+        try:
+            prompt, semantic_key, namespace = self._quiz_batch_request(requests, class_level)
+            response_text = await self._asafe_call(prompt, semantic_key=semantic_key, semantic_namespace=namespace,
+                                                   semantic_ttl=QUIZ_SEMANTIC_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Error generating RAG-enhanced quiz questions: {e}")
+            response_text = None
+        return self._quiz_batch_results(requests, response_text)
+    
+    async def agenerate_quiz_questions(self, subject="Physics", class_level=10, n=10, difficulty='medium', topic=None):
+        """Async variant of generate_quiz_questions"""
+        request = {'id': 'quiz', 'n': n, 'difficulty': difficulty, 'topic': topic}
+        return (await self.agenerate_quiz_questions_batch([request], subject, class_level))['quiz']
     
     def _fallback_physics_questions(self, n, topic=None):
         """Comprehensive fallback Class 10 Physics questions"""
-        physics_questions = [
-            {
-                'question': 'What is the SI unit of electric current?',
-                'options': ['Volt (V)', 'Ampere (A)', 'Ohm (Ω)', 'Watt (W)'],
-                'correct': 1,
-                'explanation': 'Ampere (A) is the SI unit of electric current, representing 1 coulomb of charge per second.'
-            },
-            {
-                'question': 'Which type of mirror is used in car headlights?',
-                'options': ['Plane mirror', 'Concave mirror', 'Convex mirror', 'Cylindrical mirror'],
-                'correct': 1,
-                'explanation': 'Concave mirrors are used in headlights as they produce parallel beams of light when the bulb is at the focus.'
-            },
-            {
-                'question': 'What is the power of a lens having focal length of 50 cm?',
-                'options': ['+2 D', '-2 D', '+0.5 D', '+5 D'],
-                'correct': 0,
-                'explanation': 'Power P = 1/f (in meters) = 1/0.5 = +2 D. Convex lens has positive power.'
-            },
-            {
-                'question': 'According to Ohm\'s law, if voltage doubles and resistance remains constant, current will:',
-                'options': ['Remain same', 'Double', 'Become half', 'Become four times'],
-                'correct': 1,
-                'explanation': 'From V = IR, if V doubles and R is constant, then I also doubles to maintain the relationship.'
-            },
-            {
-                'question': 'The phenomenon of electromagnetic induction was discovered by:',
-                'options': ['Newton', 'Faraday', 'Ohm', 'Ampere'],
-                'correct': 1,
-                'explanation': 'Michael Faraday discovered electromagnetic induction in 1831.'
-            },
-            {
-                'question': 'In series combination of resistors, which quantity remains same?',
-                'options': ['Voltage', 'Current', 'Resistance', 'Power'],
-                'correct': 1,
-                'explanation': 'In series combination, current remains same through all resistors as there is only one path.'
-            },
-            {
-                'question': 'The angle of incidence is equal to angle of reflection. This is:',
-                'options': ['First law of reflection', 'Second law of reflection', 'Snell\'s law', 'Lens formula'],
-                'correct': 1,
-                'explanation': 'The second law of reflection states that angle of incidence equals angle of reflection.'
-            },
-            {
-                'question': 'What happens to the resistance of a conductor when temperature increases?',
-                'options': ['Increases', 'Decreases', 'Remains same', 'Becomes zero'],
-                'correct': 0,
-                'explanation': 'For metallic conductors, resistance increases with increase in temperature due to increased atomic vibrations.'
-            },
-            {
-                'question': 'The refractive index of water is 1.33. This means light in water travels at:',
-                'options': ['Same speed as in air', '1.33 times faster than in air', '1.33 times slower than in air', 'Infinite speed'],
-                'correct': 2,
-                'explanation': 'Refractive index n = c/v, where c is speed in vacuum and v is speed in medium. Higher n means slower speed.'
-            },
-            {
-                'question': 'Electric power consumed by a device is measured in:',
-                'options': ['Volt', 'Ampere', 'Watt', 'Ohm'],
-                'correct': 2,
-                'explanation': 'Power is measured in Watts (W). Power P = VI = I²R = V²/R.'
-            }
-        ]
+        physics_questions = FALLBACK_PHYSICS_QUESTIONS
         
         # Select questions based on topic if specified
         if topic:
-            filtered_questions = []
-            topic_lower = topic.lower()
-            for q in physics_questions:
-                if any(keyword in q['question'].lower() or keyword in q['explanation'].lower() 
-                       for keyword in topic_lower.split()):
-                    filtered_questions.append(q)
-            if filtered_questions:
-                physics_questions = filtered_questions
-        
-        # Repeat and modify questions to reach desired count
+            ids = set().union(*(_fallback_ids_for_keyword(keyword) for keyword in topic.lower().split()))
+            if ids:
+                physics_questions = [physics_questions[i] for i in sorted(ids)]
+        
+        # Repeat questions to reach desired count; only the repeats are copied (to number them)
         questions = []
-        for i in range(n):
-            q = physics_questions[i % len(physics_questions)].copy()
+        for i, q in enumerate(islice(cycle(physics_questions), n)):
             if i >= len(physics_questions):
-                q['question'] = f"[Q{i+1}] " + q['question']
+                q = {**q, 'question': f"[Q{i+1}] " + q['question']}
             questions.append(q)
         
         return questions
@@ -301,22 +1097,19 @@ class GeminiAI:
             chapter = subjects[0] if is_chapter_plan else None
             
             # Get relevant context
-            if self.rag:
-                if is_chapter_plan:
-                    context = self.rag.get_context_for_query(f"Class 10 Physics {chapter} chapter concepts formulas")
-                else:
-                    context = self.rag.get_context_for_query("Class 10 Physics chapters syllabus")
+            if is_chapter_plan:
+                context = self._topic_context(f"Class 10 Physics {chapter} chapter concepts formulas")
             else:
-                context = ""
+                context = self._topic_context("Class 10 Physics chapters syllabus")
             
             # Format performance data
-            performance_summary = """
+            summary_parts = ["""
 ## 📊 **Current Performance Analysis**
 
 Below is your recent quiz performance and focus areas:
 
 ### 📈 **Quiz Performance by Chapter**
-"""
+"""]
             total_score = 0
             total_chapters = 0
             weak_chapters = []
@@ -343,45 +1136,45 @@ Below is your recent quiz performance and focus areas:
                         emoji = "💪"
                     else:
                         emoji = "📝"
-                    performance_summary += f"\n- {emoji} **{subject}:** {avg_score:.1f}% ({status}) - *{attempts} attempts*"
+                    summary_parts.append(f"\n- {emoji} **{subject}:** {avg_score:.1f}% ({status}) - *{attempts} attempts*")
                 
                 # Calculate overall performance
                 avg_overall = total_score / total_chapters if total_chapters > 0 else 0
                 
-                performance_summary += """
+                summary_parts.append("""
 
 ### 📋 **Performance Summary**
-"""
-                performance_summary += f"\n- 📊 **Overall Performance:** {avg_overall:.1f}%"
+""")
+                summary_parts.append(f"\n- 📊 **Overall Performance:** {avg_overall:.1f}%")
                 if weak_chapters:
-                    performance_summary += f"\n- ⚠️ **Areas Needing Focus:** {', '.join(weak_chapters)}"
+                    summary_parts.append(f"\n- ⚠️ **Areas Needing Focus:** {', '.join(weak_chapters)}")
                 if strong_chapters:
-                    performance_summary += f"\n- ✨ **Strong Areas:** {', '.join(strong_chapters)}"
+                    summary_parts.append(f"\n- ✨ **Strong Areas:** {', '.join(strong_chapters)}")
                 
                 # Add study tips based on performance
-                performance_summary += """
+                summary_parts.append("""
 
 ### 💡 **Personalized Study Tips**
-"""
+""")
                 if avg_overall >= 80:
-                    performance_summary += """
+                    summary_parts.append("""
 - 🎯 Focus on maintaining your excellent performance
 - 🧠 Challenge yourself with advanced problems
-- 🌟 Help classmates and explain concepts to reinforce learning"""
+- 🌟 Help classmates and explain concepts to reinforce learning""")
                 elif avg_overall >= 60:
-                    performance_summary += """
+                    summary_parts.append("""
 - 📝 Review weak topics more frequently
 - ✍️ Practice more numerical problems
-- 🔄 Take regular revision quizzes"""
+- 🔄 Take regular revision quizzes""")
                 else:
-                    performance_summary += """
+                    summary_parts.append("""
 - 📖 Start with basic concepts and fundamentals
 - 🎯 Focus on one topic at a time
 - ✍️ Take detailed notes and practice daily
-- 🤝 Consider joining study groups"""
+- 🤝 Consider joining study groups""")
                 
             else:
-                performance_summary += """
+                summary_parts.append("""
 - 📝 No quiz performance data yet - Ready to start fresh!
 
 ### 💪 **Getting Started Tips**
@@ -389,7 +1182,8 @@ Below is your recent quiz performance and focus areas:
 - 🎯 Take regular quizzes to track your progress
 - ✍️ Practice solving example problems daily
 - 🌟 Focus on understanding concepts before memorizing formulas
-"""
+""")
+            performance_summary = "".join(summary_parts)
             
             prompt = f"""
             Create a focused study plan for a Class 10 Physics student (CBSE).
@@ -448,385 +1242,414 @@ Below is your recent quiz performance and focus areas:
             Response in {language}.
             """
             
-            response = self._safe_call(prompt)
+            # Plans for the same topics and goal with the same strong/weak chapters are interchangeable
+            response = self._safe_call(
+                prompt,
+                cache_ttl=STUDY_PLAN_CACHE_TTL,
+                semantic_key=f"{', '.join(subjects)} | goal: {learning_goal}",
+                semantic_namespace=f"plan:{class_level}:{language}:{duration}:"
+                                   f"{','.join(sorted(weak_chapters))}:{','.join(sorted(strong_chapters))}",
+                preamble=True
+            )
             return self._format_response_with_markdown(response)
             
         except Exception as e:
-            print(f"Error generating study plan: {e}")
+            logger.error(f"Error generating study plan: {e}")
             return self._generate_fallback_study_plan()
     
     def _generate_fallback_study_plan(self):
         """Enhanced fallback study plan for Class 10 Physics"""
-        return """
-# 🚀 **7-Day Class 10 Physics Mastery Plan**
-
-*Master the fundamental concepts that govern our universe!*
-
-## 📅 **Daily Study Schedule**
-
-### **Day 1: 💡 Light - Reflection & Mirrors**
-- **🎯 Focus**: Understanding light behavior and mirror concepts
-- **📖 Topics**: 
-  - Laws of reflection
-  - Plane mirrors and image formation
-  - Spherical mirrors (concave & convex)
-  - Mirror formula: 1/v + 1/u = 1/f
-- **🧮 Practice**: Solve 8-10 numerical problems on mirrors
-- **🎬 Resources**: Search "Class 10 Physics Light Reflection NCERT" on YouTube
-- **⏰ Time**: 60-75 minutes
-- **✅ Goal**: Master mirror formula applications
-
-### **Day 2: 🌈 Refraction & Lenses**
-- **🎯 Focus**: Light bending and lens behavior
-- **📖 Topics**:
-  - Laws of refraction and Snell's law
-  - Refractive index concepts
-  - Convex and concave lenses
-  - Lens formula: 1/v - 1/u = 1/f
-- **🧮 Practice**: Lens power calculations and image formation
-- **🎬 Resources**: "Class 10 Physics Refraction Lenses"
-- **⏰ Time**: 60-75 minutes
-- **✅ Goal**: Understand lens applications
-
-### **Day 3: ⚡ Electricity Basics**
-- **🎯 Focus**: Electric current and potential difference
-- **📖 Topics**:
-  - Electric current and conventional flow
-  - Potential difference and voltage
-  - Ohm's Law: V = I × R
-  - Factors affecting resistance
-- **🧮 Practice**: Current, voltage, resistance calculations
-- **🎬 Resources**: "Class 10 Physics Electricity Ohm's Law"
-- **⏰ Time**: 60-75 minutes
-- **✅ Goal**: Apply Ohm's law confidently
-
-### **Day 4: 🔌 Resistors & Circuits**
-- **🎯 Focus**: Circuit analysis and combinations
-- **📖 Topics**:
-  - Series combination: Rs = R₁ + R₂ + R₃
-  - Parallel combination: 1/Rp = 1/R₁ + 1/R₂
-  - Mixed circuits and problem solving
-- **🧮 Practice**: Complex circuit problems
-- **🎬 Resources**: "Class 10 Physics Resistor Combinations"
-- **⏰ Time**: 60-75 minutes
-- **✅ Goal**: Solve any resistor network
-
-### **Day 5: 💪 Electric Power & Energy**
-- **🎯 Focus**: Power consumption and energy bills
-- **📖 Topics**:
-  - Electric power: P = VI = I²R = V²/R
-  - Electric energy and commercial units
-  - kWh calculations and electricity bills
-  - Heating effects of current
-- **🧮 Practice**: Power and energy numerical problems
-- **🎬 Resources**: "Class 10 Physics Electric Power Energy"
-- **⏰ Time**: 60-75 minutes
-- **✅ Goal**: Calculate electricity costs
-
-### **Day 6: 🧲 Magnetic Effects**
-- **🎯 Focus**: Magnetism and current relationship
-- **📖 Topics**:
-  - Magnetic field around current-carrying conductors
-  - Right-hand thumb rule
-  - Magnetic field due to solenoid
-  - Force on current-carrying conductor
-  - Fleming's left-hand rule
-- **🧮 Practice**: Magnetic field direction problems
-- **🎬 Resources**: "Class 10 Physics Magnetic Effects Current"
-- **⏰ Time**: 60-75 minutes
-- **✅ Goal**: Master hand rules
-
-### **Day 7: 📝 Revision & Integration**
-- **🎯 Focus**: Complete review and exam preparation
-- **📖 Topics**: All covered concepts with formula sheet
-- **🧮 Practice**: 
-  - Mixed problems from all chapters
-  - Sample question paper (3 hours)
-  - Previous year questions
-- **🎬 Resources**: "Class 10 Physics Complete Revision"
-- **⏰ Time**: 90-120 minutes
-- **✅ Goal**: Exam readiness achieved
-
-## 📈 **Weekly Learning Objectives**
-1. **🎯** Master all fundamental physics formulas
-2. **🧮** Solve 50+ numerical problems confidently  
-3. **📝** Complete detailed chapter notes
-4. **🎬** Watch 10+ educational physics videos
-5. **🧪** Understand real-world physics applications
-
-## 🧪 **Daily Practice Strategy**
-- **Morning**: Theory reading (20 mins)
-- **Afternoon**: Problem solving (30 mins)
-- **Evening**: Video watching (15 mins)
-- **Night**: Quick revision (10 mins)
-
-## 💡 **Physics Mastery Tips**
-- **📊** Draw diagrams for every concept
-- **🔢** Practice numerical problems daily
-- **🎯** Focus on NCERT examples first
-- **💭** Connect physics to daily life
-- **🤔** Ask "why" for every formula
-
-## 📝 **Assessment Checkpoints**
-- **Daily**: 5-question mini quiz
-- **Alternate days**: One complete numerical problem
-- **Weekend**: Chapter-wise test
-- **Final**: Mock exam with time limits
-
----
-**🌟 Remember**: *Physics is not just about memorizing formulas - it's about understanding how our universe works! Every concept you learn brings you closer to becoming a real scientist.* **You've got this!** 💪🚀
-
-**📞 Keep practicing, stay curious, and let physics amaze you every day!** ⚡
+        return self._FALLBACK_STUDY_PLAN_HTML
+    
+    def _chat_prompt(self, message, context=None):
+        """Build the chat prompt with RAG context and the recent conversation"""
+        # Get relevant context from knowledge base
+        rag_context = self.rag.get_context_for_query(message) if self.rag else ""
+        
+        return f"""
+        You are a helpful Physics AI Assistant for Class 10 students.
+        
+        Student Message: {message}
+        Student Name: {context.get('name', 'Student') if context else 'Student'}
+        
+        Previous conversation context:
+        {context.get('chat_history', []) if context else []}
+        
+        Relevant physics knowledge:
+        {rag_context}
+        
+        Respond in a clear, helpful, and engaging way:
+        1. If it's a physics concept question, explain with examples and formulas
+        2. If it's a problem to solve, show step-by-step solution
+        3. If it's a general question, respond naturally and guide towards physics learning
+        
+        Make responses:
+        - Clear and accurate
+        - Student-friendly
+        - Encouraging and motivating
+        - With proper physics terminology
+        - Using markdown formatting
         """
     
+    def _chat_fallback(self):
+        """Reply shown when the chat call fails"""
+        return _ERR_CHAT
+    
+    def _chat_namespace(self, context):
+        """Semantic cache namespace for first chat messages (answers may address the student by name)"""
+        name = context.get('name', 'Student') if context else 'Student'
+        language = context.get('language', 'English') if context else 'English'
+        return f"chat:{name}:{language}"
+    
     def chat(self, message, context=None):
         """Interactive physics chat with context memory"""
         try:
-            # Get relevant context from knowledge base
-            rag_context = self.rag.get_context_for_query(message) if self.rag else ""
-            
-            chat_prompt = f"""
-            You are a helpful Physics AI Assistant for Class 10 students.
-            
-            Student Message: {message}
-            Student Name: {context.get('name', 'Student') if context else 'Student'}
-            
-            Previous conversation context:
-            {context.get('chat_history', []) if context else []}
-            
-            Relevant physics knowledge:
-            {rag_context}
-            
-            Respond in a clear, helpful, and engaging way:
-            1. If it's a physics concept question, explain with examples and formulas
-            2. If it's a problem to solve, show step-by-step solution
-            3. If it's a general question, respond naturally and guide towards physics learning
-            
-            {self.visual_instruction}
-            
-            Make responses:
-            - Clear and accurate
-            - Student-friendly
-            - Encouraging and motivating
-            - With proper physics terminology
-            - Using markdown formatting
-            """
-            
-            response = self._safe_call(chat_prompt)
-            return self._format_response_with_markdown(response)
+            # Follow-up turns depend on the conversation, so only first messages are cached
+            has_history = bool(context and context.get('chat_history'))
+            namespace, embedding = None, None
+            if not has_history:
+                namespace = self._chat_namespace(context)
+                cached, embedding = self.semantic_cache.lookup(message, namespace)
+                if cached is not None:
+                    return cached
+            
+            response = self._safe_call(self._chat_prompt(message, context),
+                                       cache_ttl=None if has_history else CHAT_CACHE_TTL,
+                                       preamble=True)
+            formatted = self._format_response_with_markdown(response)
+            if namespace:
+                self.semantic_cache.add(message, formatted, namespace, embedding)
+            return formatted
             
         except Exception as e:
-            print(f"Chat error: {e}")
-            return f"""
-            💬 I'm having trouble processing that right now.
-            
-            Could you:
-            1. Rephrase your question, or
-            2. Try asking about a specific physics topic?
+            logger.error(f"Chat error: {e}")
+            return self._chat_fallback()
+    
+    async def achat(self, message, context=None):
+        """Async variant of chat"""
+        try:
+            has_history = bool(context and context.get('chat_history'))
+            namespace, embedding = None, None
+            if not has_history:
+                namespace = self._chat_namespace(context)
+                cached, embedding = self.semantic_cache.lookup(message, namespace)
+                if cached is not None:
+                    return cached
+            
+            response = await self._asafe_call(self._chat_prompt(message, context),
+                                              cache_ttl=None if has_history else CHAT_CACHE_TTL,
+                                              preamble=True)
+            formatted = self._format_response_with_markdown(response)
+            if namespace:
+                self.semantic_cache.add(message, formatted, namespace, embedding)
+            return formatted
             
-            I'm here to help with:
-            - 💡 Physics concepts
-            - 📝 Problem solving
-            - 🔬 Experiments and applications
-            - 📚 Study guidance
+        except Exception as e:
+            logger.error(f"Chat error: {e}")
+            return self._chat_fallback()
+    
+    def chat_stream(self, message, context=None):
+        """Stream a chat reply as ('chunk', text) / ('html', block) events followed by ('done', html)"""
+        try:
+            has_history = bool(context and context.get('chat_history'))
+            namespace, embedding = None, None
+            if not has_history:
+                namespace = self._chat_namespace(context)
+                cached, embedding = self.semantic_cache.lookup(message, namespace)
+                if cached is not None:
+                    yield ('done', cached)
+                    return
+            
+            yield from self._stream_reply(self._chat_prompt(message, context),
+                                          None if has_history else CHAT_CACHE_TTL,
+                                          message, namespace, embedding)
             
-            Let's try again! 🚀
-            """
+        except Exception as e:
+            logger.error(f"Chat error: {e}")
+            yield ('done', self._chat_fallback())
+
+    def _doubt_prompt(self, question, class_level=10, language='English'):
+        """Build the RAG-enhanced doubt solving prompt"""
+        # Get relevant context from knowledge base
+        relevant_context = self.rag.get_context_for_query(question) if self.rag else ""
+        
+        return f"""
+        You are an expert Class 10 Physics tutor helping Indian CBSE students.
+        
+        **Student's Question:** {question}
+        **Class Level:** {class_level}
+        **Subject Focus:** Physics
+        
+        **Relevant Knowledge Context:**
+        {relevant_context}
+        
+        Provide a comprehensive, well-structured explanation:
+        
+        ## 🤔 **Understanding Your Question**
+        - Break down what's being asked clearly
+        
+        ## 💡 **Key Physics Concepts**
+        - Explain relevant physics principles
+        - Use proper scientific terminology
+        - Include formulas where applicable
+        
+        ## 📝 **Step-by-Step Solution** (if numerical)
+        - Show detailed calculations with units
+        - Explain each step clearly
+        - Include final answer with proper units
+        
+        ## 🎯 **Final Answer**
+        - Clear, concise conclusion
+        - Real-world relevance if applicable
+        
+        ## 💪 **Quick Study Tip**
+        - Memory trick or important concept to remember
+        
+        ## 📚 **Related Topics**
+        - What else to study for deeper understanding
+        
+        Use emojis, **bold text**, proper physics units, and bullet points for clarity.
+        Keep explanation under 400 words but comprehensive.
+        Be encouraging and make physics exciting!
+        Response in {language}.
+        """
+    
+    def _doubt_fallback(self, error):
+        """Reply shown when a doubt cannot be answered"""
+        return _ERR_DOUBT_TEMPLATE.format_map({'error': str(error)[:100]})
 
     def solve_doubt(self, question, class_level=10, language='English', subjects=['Physics']):
         """Solve physics doubts with RAG-enhanced explanations"""
         try:
-            # Get relevant context from knowledge base
-            relevant_context = self.rag.get_context_for_query(question) if self.rag else ""
-            
-            prompt = f"""
-            You are an expert Class 10 Physics tutor helping Indian CBSE students.
-            
-            **Student's Question:** {question}
-            **Class Level:** {class_level}
-            **Subject Focus:** Physics
-            
-            **Relevant Knowledge Context:**
-            {relevant_context}
+            namespace = f"doubt:{class_level}:{language}"
+            cached, embedding = self.semantic_cache.lookup(question, namespace)
+            if cached is not None:
+                return cached
             
-            Provide a comprehensive, well-structured explanation:
+            response = self._safe_call(self._doubt_prompt(question, class_level, language),
+                                       cache_ttl=DOUBT_CACHE_TTL, preamble=True)
+            formatted = self._format_response_with_markdown(response)
+            self.semantic_cache.add(question, formatted, namespace, embedding)
+            return formatted
             
-            ## 🤔 **Understanding Your Question**
-            - Break down what's being asked clearly
-            
-            ## 💡 **Key Physics Concepts**
-            - Explain relevant physics principles
-            - Use proper scientific terminology
-            - Include formulas where applicable
-            
-            ## 📝 **Step-by-Step Solution** (if numerical)
-            - Show detailed calculations with units
-            - Explain each step clearly
-            - Include final answer with proper units
-            
-            ## 🎯 **Final Answer**
-            - Clear, concise conclusion
-            - Real-world relevance if applicable
-            
-            ## 💪 **Quick Study Tip**
-            - Memory trick or important concept to remember
-            
-            ## 📚 **Related Topics**
-            - What else to study for deeper understanding
+        except Exception as e:
+            logger.error(f"Error solving doubt: {e}")
+            return self._doubt_fallback(e)
+    
+    async def asolve_doubt(self, question, class_level=10, language='English', subjects=['Physics']):
+        """Async variant of solve_doubt"""
+        try:
+            namespace = f"doubt:{class_level}:{language}"
+            cached, embedding = self.semantic_cache.lookup(question, namespace)
+            if cached is not None:
+                return cached
             
-            {self.visual_instruction}
+            response = await self._asafe_call(self._doubt_prompt(question, class_level, language),
+                                              cache_ttl=DOUBT_CACHE_TTL, preamble=True)
+            formatted = self._format_response_with_markdown(response)
+            self.semantic_cache.add(question, formatted, namespace, embedding)
+            return formatted
             
-            Use emojis, **bold text**, proper physics units, and bullet points for clarity.
-            Keep explanation under 400 words but comprehensive.
-            Be encouraging and make physics exciting!
-            Response in {language}.
-            """
+        except Exception as e:
+            logger.error(f"Error solving doubt: {e}")
+            return self._doubt_fallback(e)
+    
+    def solve_doubt_stream(self, question, class_level=10, language='English', subjects=['Physics']):
+        """Stream a doubt answer as ('chunk', text) / ('html', block) events followed by ('done', html)"""
+        try:
+            namespace = f"doubt:{class_level}:{language}"
+            cached, embedding = self.semantic_cache.lookup(question, namespace)
+            if cached is not None:
+                yield ('done', cached)
+                return
             
-            response = self._safe_call(prompt)
-            return self._format_response_with_markdown(response)
+            yield from self._stream_reply(self._doubt_prompt(question, class_level, language),
+                                          DOUBT_CACHE_TTL, question, namespace, embedding)
             
         except Exception as e:
-            print(f"Error solving doubt: {e}")
-            return f"""
-            ## 🤔 **I'm having trouble answering that right now!**
-            
-            **Possible reasons:**
-            - ❌ Internet connection issues
-            - 🔧 Technical problem: {str(e)[:100]}
-            
-            ## 💡 **Let's try this instead:**
-            
-            **1. 🔄 Rephrase your question** - Make it more specific
-            **2. 📶 Check internet connection** - Ensure stable connection  
-            **3. 🎯 Ask about specific topics** - Try these examples:
-            
-            ### 📚 **Example Questions I Can Help With:**
-            - **💡 Light**: "Explain laws of reflection" or "How do concave mirrors work?"
-            - **⚡ Electricity**: "What is Ohm's law?" or "How to calculate resistance?"
-            - **🧲 Magnetism**: "Right hand thumb rule" or "Electromagnetic induction"
-            - **🧮 Numerical**: "Mirror formula problem" or "Power calculation"
-            
-            ### 🚀 **I'm your Class 10 Physics expert!**
-            **Ask me anything about:**
-            - Light, mirrors, lenses 💡
-            - Electricity, current, circuits ⚡
-            - Magnetism and induction 🧲
-            - Formulas and numerical problems 🧮
-            
-            **💪 Don't give up - physics is amazing once you get it!** 🌟
-            """
+            logger.error(f"Error solving doubt: {e}")
+            yield ('done', self._doubt_fallback(e))
     
     def get_focus_areas(self, quiz_performance, subjects):
         """Analyze quiz performance and suggest physics focus areas"""
         try:
             if not quiz_performance:
-                return [
-                    "🎯 Take your first Physics quiz to get personalized recommendations!",
-                    "💡 Start with Light - Reflection and Refraction chapter",
-                    "⚡ Practice basic Electricity concepts and Ohm's law",
-                    "🧲 Explore Magnetic Effects of Electric Current"
-                ]
-            
-            focus_areas = []
-            for subject, avg_score, quiz_count in quiz_performance:
-                if avg_score < 40:
-                    focus_areas.append(f"🔴 **{subject}**: Urgent attention needed! (Score: {avg_score:.1f}%) - Review basic concepts daily")
-                elif avg_score < 60:
-                    focus_areas.append(f"🟡 **{subject}**: Need more practice (Score: {avg_score:.1f}%) - Focus on numerical problems")
-                elif avg_score < 80:
-                    focus_areas.append(f"🟢 **{subject}**: Good progress! (Score: {avg_score:.1f}%) - Polish advanced topics")
-                else:
-                    focus_areas.append(f"⭐ **{subject}**: Excellent work! (Score: {avg_score:.1f}%) - Try challenging problems")
+                return list(_FA_FIRST_QUIZ)
             
-            # Add specific physics recommendations
-            if any(score < 60 for _, score, _ in quiz_performance):
-                focus_areas.append("📚 **Recommendation**: Revise NCERT examples and practice more numericals")
-            
-            return focus_areas[:5]
+            return list(_focus_areas_for(tuple(map(tuple, quiz_performance))))
             
         except Exception as e:
-            print(f"Error getting focus areas: {e}")
-            return [
-                "🎯 Continue regular physics practice across all chapters",
-                "💡 Focus on understanding concepts before memorizing formulas",
-                "⚡ Practice numerical problems daily",
-                "🧲 Connect physics concepts to real-world applications"
-            ]
+            logger.error(f"Error getting focus areas: {e}")
+            return list(_FA_ERROR)
     
-    def get_detailed_explanation(self, question, correct_answer, user_answer, subject="Physics", class_level=10, chapter=""):
-        """Generate detailed explanation for quiz questions"""
+    def get_quick_explanations_batch(self, questions, subject="Physics", class_level=10):
+        """Generate brief explanations for several quiz questions in a single call"""
+        if not questions:
+            return []
         try:
-            # Get relevant context from RAG
-            search_query = f"{question} {chapter} physics concept"
-            relevant_context = self.rag.get_context_for_query(search_query) if self.rag else ""
+            numbered_questions = "\n".join(
+                f"{i + 1}. Question: {q['question']}\n   Correct Answer: {q['correct_answer']}"
+                for i, q in enumerate(questions)
+            )
             
             prompt = f"""
-            Generate a detailed physics explanation for a Class {class_level} student who answered a quiz question.
-
-            **Question:** {question}
-            **Correct Answer:** {correct_answer}
-            **Student's Answer:** {user_answer}
-            **Chapter:** {chapter}
+            For each Class {class_level} {subject} quiz question below, write a brief explanation (1-2 sentences)
+            of why the correct answer is right. Include the formula if applicable.
             
-            **Relevant Context:**
-            {relevant_context}
-
-            Provide a comprehensive explanation with:
-
-            ### 💡 **Core Concept**
-            - Explain the fundamental physics principle
-            - Define key terms and variables
-            - Reference relevant laws/formulas
+            {numbered_questions}
             
-            ### 📝 **Detailed Solution**
-            - Step-by-step explanation
-            - Why the correct answer is right
-            - Why other options are wrong
-            - Include formulas and calculations if relevant
+            Return ONLY a valid JSON array of exactly {len(questions)} strings, in the same order as the questions.
+            """
             
-            ### 🔍 **Common Misconceptions**
-            - Address why students might choose wrong answers
-            - Clarify confusing aspects
+            response_text = self._safe_call(prompt, cache_ttl=EXPLANATION_CACHE_TTL)
+            json_text = _extract_json(response_text)
+            if json_text:
+                explanations = _loads_json(json_text)
+                if isinstance(explanations, list) and len(explanations) == len(questions):
+                    return [str(explanation) for explanation in explanations]
             
-            ### 🌟 **Key Takeaways**
-            - Important points to remember
-            - Tips for similar questions
-            - Real-world applications
+            return [''] * len(questions)
             
-            ### 📚 **Related Topics**
-            - Connected concepts to study
-            - Suggested practice problems
+        except Exception as e:
+            logger.error(f"Error generating quick explanations: {e}")
+            return [''] * len(questions)
+    
+    def _explanation_prompt(self, question, correct_answer, user_answer, class_level, chapter, relevant_context):
+        """Build the detailed explanation prompt for one quiz question"""
+        return f"""
+        Generate a detailed physics explanation for a Class {class_level} student who answered a quiz question.
 
-            {self.visual_instruction}
+        **Question:** {question}
+        **Correct Answer:** {correct_answer}
+        **Student's Answer:** {user_answer}
+        **Chapter:** {chapter}
+        
+        **Relevant Context:**
+        {relevant_context}
 
-            Use proper physics terminology, emojis, bold text, and bullet points.
-            Make it engaging and educational.
-            """
-            
-            response = self._safe_call(prompt)
-            return self._format_response_with_markdown(response)
-            
-        except Exception as e:
-            print(f"Error generating detailed explanation: {e}")
-            return f"""
-            ### ❌ **Oops! Technical Difficulty**
-            
-            I'm having trouble generating a detailed explanation right now.
-            
-            ### 💡 **Quick Explanation:**
-            The correct answer is: **{correct_answer}**
-            
-            ### 🎯 **Study Tips:**
-            - Review {chapter} chapter in your NCERT textbook
-            - Practice similar problems
-            - Ask your teacher for clarification
-            
-            ### 🚀 **Keep Going!**
-            Don't worry! Physics becomes clearer with practice. Keep exploring!
-            """
+        Provide a comprehensive explanation with:
+
+        ### 💡 **Core Concept**
+        - Explain the fundamental physics principle
+        - Define key terms and variables
+        - Reference relevant laws/formulas
+        
+        ### 📝 **Detailed Solution**
+        - Step-by-step explanation
+        - Why the correct answer is right
+        - Why other options are wrong
+        - Include formulas and calculations if relevant
+        
+        ### 🔍 **Common Misconceptions**
+        - Address why students might choose wrong answers
+        - Clarify confusing aspects
+        
+        ### 🌟 **Key Takeaways**
+        - Important points to remember
+        - Tips for similar questions
+        - Real-world applications
+        
+        ### 📚 **Related Topics**
+        - Connected concepts to study
+        - Suggested practice problems
 
+        {self.visual_instruction}
+
+        Use proper physics terminology, emojis, bold text, and bullet points.
+        Make it engaging and educational.
+        """
+    
+    def _explanation_fallback(self, correct_answer, chapter):
+        """Explanation shown when the model call fails"""
+        return _ERR_EXPLANATION_TEMPLATE.format_map({'correct_answer': correct_answer, 'chapter': chapter})
+    
+    def get_detailed_explanation(self, question, correct_answer, user_answer, subject="Physics", class_level=10, chapter=""):
+        """Generate detailed explanation for quiz questions"""
+        cache_key = self._input_key(question, correct_answer, user_answer, chapter, class_level)
+        cached = None if IGNORE_AI_CACHE else self._explanation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        try:
+            # Get relevant context from RAG
+            search_query = f"{question} {chapter} physics concept"
+            relevant_context = self.rag.get_context_for_query(search_query) if self.rag else ""
+        
+            prompt = self._explanation_prompt(question, correct_answer, user_answer, class_level, chapter, relevant_context)
+            response = self._safe_call(prompt, cache_ttl=EXPLANATION_CACHE_TTL)
+            explanation = self._format_response_with_markdown(response)
+            if response:
+                self._explanation_cache.set(cache_key, explanation)
+            return explanation
+        
+        except Exception as e:
+            logger.error(f"Error generating detailed explanation: {e}")
+            return self._explanation_fallback(correct_answer, chapter)
+    
+    def get_detailed_explanations_batch(self, questions, subject="Physics", class_level=10, chapter="",
+                                        timeout=EXPLANATION_BATCH_TIMEOUT):
+        """Detailed explanations for several quiz questions, generated concurrently
+        
+        questions is a list of dicts with 'question', 'correct_answer' and 'user_answer'.
+        Retrieval for the whole review is one batched RAG lookup and the model calls
+        run in parallel on a thread pool, so an N-question review takes about as long
+        as its slowest answer. Questions still unanswered after timeout seconds get
+        the fallback explanation.
+        """
+        results = [None] * len(questions)
+        keys = [self._input_key(q['question'], q['correct_answer'], q['user_answer'], chapter, class_level)
+                for q in questions]
+        if not IGNORE_AI_CACHE:
+            for i, key in enumerate(keys):
+                results[i] = self._explanation_cache.get(key)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        
+        try:
+            queries = [f"{questions[i]['question']} {chapter} physics concept" for i in pending]
+            contexts_by_query = self.rag.get_context_for_queries(queries) if self.rag else {}
+            futures = [
+                self._call_pool.submit(
+                    self._safe_call,
+                    self._explanation_prompt(questions[i]['question'], questions[i]['correct_answer'],
+                                             questions[i]['user_answer'], class_level, chapter,
+                                             contexts_by_query.get(query, "")),
+                    cache_ttl=EXPLANATION_CACHE_TTL)
+                for i, query in zip(pending, queries)
+            ]
+            wait(futures, timeout=timeout)
+            responses = []
+            for future in futures:
+                if not future.done():
+                    future.cancel()
+                    responses.append(TimeoutError(f"no answer within {timeout}s"))
+                else:
+                    responses.append(future.exception() or future.result())
+        except Exception as e:
+            logger.error(f"Error generating detailed explanations: {e}")
+            responses = [e] * len(pending)
+        
+        for i, response in zip(pending, responses):
+            if isinstance(response, Exception) or not response:
+                if isinstance(response, Exception):
+                    logger.error(f"Error generating detailed explanation: {response}")
+                results[i] = self._explanation_fallback(questions[i]['correct_answer'], chapter)
+            else:
+                results[i] = self._format_response_with_markdown(response)
+                self._explanation_cache.set(keys[i], results[i])
+        return results
+    
     def get_motivation(self, performance, name, language='English', streak=0, quiz_count=0):
         """Generate physics-specific motivational content"""
+        # Quiz counts past a handful are rounded down to a multiple of 5 so nearby
+        # counts share a message (the prompt says "N+ quizzes")
+        quiz_bucket = quiz_count if quiz_count < 5 else quiz_count // 5 * 5
+        quiz_progress = f"{quiz_bucket}+" if quiz_count >= 5 else f"{quiz_count}"
+        perf_bucket = 2 if performance >= 80 else 1 if performance >= 60 else 0
+        cache_key = self._input_key(perf_bucket, name, language, streak, quiz_bucket)
+        cached = None if IGNORE_AI_CACHE else self._motivation_cache.get(cache_key)
+        if cached is not None:
+            return cached
         try:
             if performance >= 80:
                 performance_level = "outstanding"
@@ -858,26 +1681,25 @@ Below is your recent quiz performance and focus areas:
             - Use emojis and exciting language
             - Tone: {tone}
             {f'- Acknowledge their {streak}-day study streak' if streak > 0 else ''}
-            {f'- Mention their quiz progress ({quiz_count} quizzes taken)' if quiz_count > 0 else ''}
+            {f'- Mention their quiz progress ({quiz_progress} quizzes taken)' if quiz_count > 0 else ''}
             
             Response in {language}.
             """
             
-            response = self._safe_call(prompt)
-            return f"{emoji} " + self._format_response_with_markdown(response)
+            response = self._safe_call(prompt, cache_ttl=MOTIVATION_CACHE_TTL)
+            motivation = f"{emoji} " + self._format_response_with_markdown(response)
+            if response:
+                self._motivation_cache.set(cache_key, motivation)
+            return motivation
             
         except Exception as e:
-            physics_quotes = [
-                f"🌟 **Fantastic work, {name}!** Just like light travels at 3×10⁸ m/s, your physics knowledge is expanding at incredible speed! Keep exploring the universe! 🚀💡",
-                f"⚡ **{name}, you're electrifying!** Remember, Einstein once said imagination is more important than knowledge. Your curiosity today shapes tomorrow's discoveries! 🧠🌌",
-                f"🚀 **Keep it up, {name}!** From Newton's apple 🍎 to Einstein's relativity, every great physicist started with questions just like yours. You're on the path to greatness! 🎯",
-                f"💪 **{name}, stay charged up!** Just like energy can neither be created nor destroyed, your effort in learning physics will always transform into success! ⚡📈",
-                f"🎯 **Focus mode activated, {name}!** Every formula you master is like unlocking a secret of the universe. From Ohm's law to electromagnetic induction - you're becoming a real scientist! 🧪🔬",
-                f"🌟 **Brilliant work, {name}!** Physics is everywhere - in your smartphone 📱, the sunset 🌅, and even in your heartbeat ❤️. You're learning to decode the language of nature! 🌍"
-            ]
-            return random.choice(physics_quotes)
+            return random.choice(self._PHYSICS_QUOTE_TEMPLATES).format(name=name)
+
+# The fallback plan never changes, so it is formatted once rather than per failure
+GeminiAI._FALLBACK_STUDY_PLAN_HTML = GeminiAI._format_response_with_markdown(FALLBACK_STUDY_PLAN)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     print("\n" + "="*50)
     print("🛠️  TESTING GEMINI UTILS INITIALIZATION")
     print("="*50)
@@ -1,17 +1,106 @@
+import logging
 import json
 import os
 from typing import List, Dict, Any
 import re
-from difflib import SequenceMatcher
+import pickle
+import threading
+import time
+import math
+import heapq
+import bisect
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import accumulate
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity above which two questions are treated as the same question
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# BM25 parameters for chunk retrieval; subtopic and chapter words are repeated
+# in each chunk's document so they weigh more than body text
+BM25_K1 = 1.5
+BM25_B = 0.75
+SUBTOPIC_WEIGHT = 2
+CHAPTER_WEIGHT = 1
+
+# Retrieval results are memoized per normalized query until the KB is reloaded
+RETRIEVAL_CACHE_SIZE = 512
+
+_TOKEN_RE = re.compile(r'\b\w+\b')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_query(query: str) -> str:
+    """Lowercase and collapse whitespace so equivalent queries share a cache entry"""
+    return _WHITESPACE_RE.sub(' ', query.strip().lower())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for both indexing and queries"""
+    return _TOKEN_RE.findall(text.lower())
 
 class RAGKnowledgeBase:
     def __init__(self, knowledge_base_path: str = "data/rag_knowledge_base.json"):
         self.knowledge_base_path = knowledge_base_path
         self.knowledge_chunks = []
+        self.postings = {}
+        self.idf = {}
+        self.doc_norms = []
+        self.subtopic_index = {}
         self.load_knowledge_base()
     
+    @property
+    def index_cache_path(self) -> str:
+        """Pickle holding the chunks and BM25 index built from knowledge_base_path"""
+        return os.path.splitext(self.knowledge_base_path)[0] + '.pkl'
+    
+    def _index_signature(self):
+        """What the pickled index depends on: the JSON file's mtime and the BM25 settings"""
+        return (os.path.getmtime(self.knowledge_base_path), BM25_K1, BM25_B, SUBTOPIC_WEIGHT, CHAPTER_WEIGHT)
+    
+    def _load_index_cache(self) -> bool:
+        """Restore chunks and index from the pickle if it matches the JSON file"""
+        try:
+            with open(self.index_cache_path, 'rb') as f:
+                data = pickle.load(f)
+            if data['signature'] != self._index_signature():
+                return False
+            self.knowledge_chunks = data['chunks']
+            self.postings = data['postings']
+            self.idf = data['idf']
+            self.doc_norms = data['doc_norms']
+            self.subtopic_index = data['subtopic_index']
+            return True
+        except Exception:
+            # Missing, stale-format or corrupted pickle: rebuild from JSON
+            return False
+    
+    def _save_index_cache(self):
+        """Pickle the chunks and index next to the JSON file for the next start"""
+        try:
+            with open(self.index_cache_path, 'wb') as f:
+                pickle.dump({'signature': self._index_signature(), 'chunks': self.knowledge_chunks,
+                             'postings': self.postings, 'idf': self.idf, 'doc_norms': self.doc_norms,
+                             'subtopic_index': self.subtopic_index}, f)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save knowledge base index: {e}")
+    
     def load_knowledge_base(self):
-        """Load physics knowledge base from JSON file"""
+        """Load physics knowledge base from JSON file (or its prebuilt index pickle)"""
+        if os.path.exists(self.knowledge_base_path) and self._load_index_cache():
+            logger.info(f"✅ Loaded {len(self.knowledge_chunks)} physics knowledge chunks (prebuilt index)")
+        else:
+            self._load_json()
+            self._build_index()
+            self._save_index_cache()
+        
+        # Fresh memoization per load, so a reload never serves stale contexts
+        self._cached_search = lru_cache(maxsize=RETRIEVAL_CACHE_SIZE)(self._search)
+        self._cached_context = lru_cache(maxsize=RETRIEVAL_CACHE_SIZE)(self._context)
+    
+    def _load_json(self):
+        """Read the chunks from JSON, creating the sample knowledge base if that fails"""
         try:
             if os.path.exists(self.knowledge_base_path):
                 with open(self.knowledge_base_path, 'r', encoding='utf-8') as f:
@@ -20,178 +109,137 @@ class RAGKnowledgeBase:
                         self.knowledge_chunks = data
                     else:
                         self.knowledge_chunks = data.get('chunks', [])
-                print(f"✅ Loaded {len(self.knowledge_chunks)} physics knowledge chunks")
+                logger.info(f"✅ Loaded {len(self.knowledge_chunks)} physics knowledge chunks")
             else:
-                print(f"❌ Knowledge base file not found: {self.knowledge_base_path}")
+                logger.error(f"❌ Knowledge base file not found: {self.knowledge_base_path}")
                 self._create_sample_knowledge_base()
         except Exception as e:
-            print(f"❌ Error loading knowledge base: {e}")
+            logger.error(f"❌ Error loading knowledge base: {e}")
             self._create_sample_knowledge_base()
     
+    def _build_index(self):
+        """Build the BM25 inverted index (token -> [(chunk index, term frequency)])
+        
+        Everything that depends only on the corpus (idf, length normalization per
+        chunk) is computed here, parallel to knowledge_chunks, not per query.
+        """
+        postings = defaultdict(list)
+        subtopic_index = defaultdict(list)
+        doc_lengths = []
+        for i, chunk in enumerate(self.knowledge_chunks):
+            subtopic_tokens = tokenize(chunk.get('subtopic', ''))
+            tokens = (tokenize(chunk.get('chunk', ''))
+                      + subtopic_tokens * SUBTOPIC_WEIGHT
+                      + tokenize(chunk.get('chapter', '')) * CHAPTER_WEIGHT)
+            doc_lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                postings[token].append((i, tf))
+            for token in set(subtopic_tokens):
+                subtopic_index[token].append(i)
+        
+        n_docs = len(doc_lengths)
+        avg_doc_length = sum(doc_lengths) / n_docs if n_docs else 0.0
+        self.postings = dict(postings)
+        self.subtopic_index = dict(subtopic_index)
+        # idf already multiplied by the (k1 + 1) numerator factor
+        self.idf = {token: math.log((n_docs - len(docs) + 0.5) / (len(docs) + 0.5) + 1) * (BM25_K1 + 1)
+                    for token, docs in self.postings.items()}
+        self.doc_norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / avg_doc_length) for length in doc_lengths]
+    
     def _create_sample_knowledge_base(self):
         """Create comprehensive Class 10 Physics knowledge base"""
-        sample_chunks = [
-            {
-                "chunk": "Light is a form of energy which enables us to see objects. We see objects when light emitted or reflected by them reaches our eyes. Light travels in straight lines. This can be observed from the fact that a small source of light casts sharp shadows of opaque objects. The straight-line path of light is called a ray of light.",
-                "subtopic": "Nature of Light",
-                "chapter": "Light - Reflection and Refraction"
-            },
-            {
-                "chunk": "When light falls on a surface, it can be reflected, absorbed, or transmitted. The phenomenon of bouncing back of light rays from a surface is called reflection. Laws of reflection: (1) The incident ray, reflected ray and normal all lie in the same plane. (2) The angle of incidence is equal to the angle of reflection (∠i = ∠r).",
-                "subtopic": "Reflection of Light",
-                "chapter": "Light - Reflection and Refraction"
-            },
-            {
-                "chunk": "A spherical mirror is a mirror whose reflecting surface is part of a sphere. There are two types: Concave mirror (converging mirror) - curves inward, can form real and virtual images. Convex mirror (diverging mirror) - curves outward, always forms virtual, diminished images. The focal length f = R/2, where R is radius of curvature.",
-                "subtopic": "Spherical Mirrors",
-                "chapter": "Light - Reflection and Refraction"
-            },
-            {
-                "chunk": "Mirror formula: 1/v + 1/u = 1/f, where v = image distance, u = object distance, f = focal length. Magnification m = -v/u = height of image/height of object. For concave mirrors, focal length is positive; for convex mirrors, focal length is negative.",
-                "subtopic": "Mirror Formula",
-                "chapter": "Light - Reflection and Refraction"
-            },
-            {
-                "chunk": "Refraction is the bending of light when it travels from one transparent medium to another. This happens due to change in speed of light in different media. Laws of refraction: (1) Incident ray, refracted ray and normal lie in the same plane. (2) Snell's law: n₁sin(θ₁) = n₂sin(θ₂), where n is refractive index.",
-                "subtopic": "Refraction of Light",
-                "chapter": "Light - Reflection and Refraction"
-            },
-            {
-                "chunk": "A lens is a transparent object with at least one curved surface that can converge or diverge light rays. Convex lens (converging lens) - thicker at center, focal length positive, can form real and virtual images. Concave lens (diverging lens) - thinner at center, focal length negative, always forms virtual images.",
-                "subtopic": "Lenses",
-                "chapter": "Light - Reflection and Refraction"
-            },
-            {
-                "chunk": "Lens formula: 1/v - 1/u = 1/f. Power of lens P = 1/f (in meters), measured in diopters (D). For combination of lenses: P = P₁ + P₂ + ... The human eye works like a camera with a convex lens (crystalline lens) forming real, inverted images on retina.",
-                "subtopic": "Lens Formula and Human Eye",
-                "chapter": "Light - Reflection and Refraction"
-            },
-            {
-                "chunk": "Electric current is the flow of electric charge through a conductor. SI unit is ampere (A). One ampere = 1 coulomb/second. Current flows from positive terminal to negative terminal (conventional current direction). In metals, current is due to flow of free electrons (opposite to conventional current).",
-                "subtopic": "Electric Current",
-                "chapter": "Electricity"
-            },
-            {
-                "chunk": "Electric potential difference (voltage) is the work done per unit charge to move charge between two points. V = W/Q. SI unit is volt (V). One volt = 1 joule/coulomb. Potential difference drives current through a circuit. Higher voltage means more energy per unit charge.",
-                "subtopic": "Electric Potential",
-                "chapter": "Electricity"
-            },
-            {
-                "chunk": "Ohm's Law states that current through a conductor is directly proportional to potential difference across it, provided temperature remains constant. V = I × R, where V = voltage, I = current, R = resistance. Resistance opposes flow of current. SI unit of resistance is ohm (Ω).",
-                "subtopic": "Ohm's Law",
-                "chapter": "Electricity"
-            },
-            {
-                "chunk": "Factors affecting resistance: (1) Length - R ∝ l (2) Area of cross-section - R ∝ 1/A (3) Material - depends on resistivity ρ (4) Temperature - for conductors, R increases with temperature. Formula: R = ρl/A. Resistivity is a material property.",
-                "subtopic": "Resistance",
-                "chapter": "Electricity"
-            },
-            {
-                "chunk": "Series combination: Resistances add up, Rs = R₁ + R₂ + R₃... Current same through all resistors. Parallel combination: 1/Rp = 1/R₁ + 1/R₂ + 1/R₃... Voltage same across all resistors. Parallel combination gives less total resistance than individual resistances.",
-                "subtopic": "Resistor Combinations",
-                "chapter": "Electricity"
-            },
-            {
-                "chunk": "Electric power is the rate of consumption of electric energy. P = VI = I²R = V²/R. SI unit is watt (W). Electric energy consumed = P × t = VIt. Commercial unit of energy is kilowatt-hour (kWh). 1 kWh = 3.6 × 10⁶ J. Electric bill is based on energy consumed.",
-                "subtopic": "Electric Power",
-                "chapter": "Electricity"
-            },
-            {
-                "chunk": "A magnetic field exists around a magnet and current-carrying conductor. Magnetic field lines are imaginary lines showing direction of magnetic field. They emerge from North pole and enter South pole. Field lines never intersect. Uniform field has parallel, equally spaced lines.",
-                "subtopic": "Magnetic Field",
-                "chapter": "Magnetic Effects of Electric Current"
-            },
-            {
-                "chunk": "Current-carrying conductor produces magnetic field. Direction given by Right Hand Thumb Rule: Thumb shows current direction, fingers curl in direction of magnetic field. For circular loop: field lines are circular near wire, straight at center. For solenoid: behaves like bar magnet.",
-                "subtopic": "Magnetic Field due to Current",
-                "chapter": "Magnetic Effects of Electric Current"
-            },
-            {
-                "chunk": "Force on current-carrying conductor in magnetic field: F = BIl sin θ, where B = magnetic field, I = current, l = length, θ = angle. Direction by Fleming's Left Hand Rule: Thumb = Force, Index finger = Field, Middle finger = Current. Used in electric motors.",
-                "subtopic": "Force on Current-carrying Conductor",
-                "chapter": "Magnetic Effects of Electric Current"
-            },
-            {
-                "chunk": "Electromagnetic induction: When magnetic flux through a conductor changes, EMF is induced. Faraday's laws: (1) Changing magnetic flux induces EMF. (2) Induced EMF = -dΦ/dt. Fleming's Right Hand Rule gives direction of induced current. Used in generators, transformers.",
-                "subtopic": "Electromagnetic Induction",
-                "chapter": "Magnetic Effects of Electric Current"
-            }
-        ]
-        
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(self.knowledge_base_path), exist_ok=True)
+        from sample_physics_chunks import SAMPLE_CHUNKS
+        self.knowledge_chunks = SAMPLE_CHUNKS
         
         # Save comprehensive physics data
-        with open(self.knowledge_base_path, 'w', encoding='utf-8') as f:
-            json.dump(sample_chunks, f, indent=2, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(self.knowledge_base_path), exist_ok=True)
+            with open(self.knowledge_base_path, 'w', encoding='utf-8') as f:
+                json.dump(SAMPLE_CHUNKS, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save knowledge base: {e}")
         
-        self.knowledge_chunks = sample_chunks
-        print(f"✅ Created comprehensive physics knowledge base with {len(sample_chunks)} chunks")
-    
-    def similarity_score(self, text1: str, text2: str) -> float:
-        """Calculate similarity between two texts"""
-        return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+        logger.info(f"✅ Created comprehensive physics knowledge base with {len(SAMPLE_CHUNKS)} chunks")
     
     def search_relevant_chunks(self, query: str, top_k: int = 3) -> List[Dict]:
         """Search for relevant knowledge chunks based on query"""
-        if not self.knowledge_chunks:
-            return []
+        return list(self._cached_search(normalize_query(query), top_k))
+    
+    def _term_scores(self, token: str) -> tuple:
+        """BM25 contribution of one query term: ((chunk index, score), ...)"""
+        docs = self.postings.get(token)
+        if not docs:
+            return ()
+        idf = self.idf[token]
+        doc_norms = self.doc_norms
+        return tuple((i, idf * tf / (tf + doc_norms[i])) for i, tf in docs)
+    
+    def _rank(self, query_tokens: set, top_k: int, term_scores: Dict[str, tuple]) -> List[int]:
+        """Indexes of the top_k chunks for the query tokens, given each token's term scores"""
+        # Queries naming a subtopic ("ohm's law", "mirror formula") hit only a few
+        # chunks; when those alone can fill top_k, rank just them
+        hits = set().union(*(self.subtopic_index.get(token, ()) for token in query_tokens))
+        candidates = hits if top_k <= len(hits) <= top_k * 2 else None
         
-        scored_chunks = []
-        query_lower = query.lower()
+        # BM25 over the postings of the query terms only
+        scores = defaultdict(float)
+        for token in query_tokens:
+            for i, score in term_scores[token]:
+                if candidates is None or i in candidates:
+                    scores[i] += score
         
-        for chunk in self.knowledge_chunks:
-            chunk_text = chunk.get('chunk', '').lower()
-            subtopic = chunk.get('subtopic', '').lower()
-            chapter = chunk.get('chapter', '').lower()
-            
-            # Calculate relevance scores
-            content_score = self.similarity_score(query_lower, chunk_text)
-            subtopic_score = self.similarity_score(query_lower, subtopic) * 1.5
-            chapter_score = self.similarity_score(query_lower, chapter) * 1.2
-            
-            # Keyword matching bonus
-            keywords = re.findall(r'\b\w+\b', query_lower)
-            keyword_score = 0
-            for keyword in keywords:
-                if keyword in chunk_text or keyword in subtopic or keyword in chapter:
-                    keyword_score += 0.3
-            
-            total_score = content_score + subtopic_score + chapter_score + min(keyword_score, 1.0)
-            
-            if total_score > 0.1:
-                scored_chunks.append({
-                    'chunk': chunk,
-                    'score': total_score
-                })
+        # Highest scores first, earlier chunks winning ties
+        return heapq.nlargest(top_k, scores, key=lambda i: (scores[i], -i))
+    
+    def _search(self, query: str, top_k: int) -> tuple:
+        if not self.knowledge_chunks:
+            return ()
         
-        scored_chunks.sort(key=lambda x: x['score'], reverse=True)
-        return [item['chunk'] for item in scored_chunks[:top_k]]
+        query_tokens = set(tokenize(query))
+        term_scores = {token: self._term_scores(token) for token in query_tokens}
+        return tuple(self.knowledge_chunks[i] for i in self._rank(query_tokens, top_k, term_scores))
     
     def get_context_for_query(self, query: str, max_context_length: int = 1200) -> str:
         """Get relevant context for a query"""
-        relevant_chunks = self.search_relevant_chunks(query, top_k=3)
-        
-        if not relevant_chunks:
-            return "Physics concepts from Class 10 curriculum."
+        return self._cached_context(normalize_query(query), max_context_length)
+    
+    def get_context_for_queries(self, queries: List[str], max_context_length: int = 1200) -> Dict[str, str]:
+        """Get the context for several queries at once (e.g. every question of a quiz review)
         
-        context_parts = []
-        current_length = 0
+        Terms shared between queries are scored once and each retrieved chunk is
+        formatted once; every query gets what get_context_for_query would return.
+        """
+        query_tokens = {query: set(tokenize(query)) for query in map(normalize_query, queries)}
+        term_scores = {token: self._term_scores(token) for token in set().union(*query_tokens.values())}
         
-        for chunk in relevant_chunks:
-            chunk_text = chunk.get('chunk', '')
-            subtopic = chunk.get('subtopic', '')
-            chapter = chunk.get('chapter', '')
-            
-            formatted_chunk = f"📚 **{chapter}** - {subtopic}:\n{chunk_text}\n"
-            
-            if current_length + len(formatted_chunk) <= max_context_length:
-                context_parts.append(formatted_chunk)
-                current_length += len(formatted_chunk)
-            else:
-                break
+        formatted = {}
+        contexts = {}
+        for query, tokens in query_tokens.items():
+            top = self._rank(tokens, 3, term_scores) if self.knowledge_chunks else []
+            for i in top:
+                if i not in formatted:
+                    formatted[i] = self._format_chunk(self.knowledge_chunks[i])
+            contexts[query] = self._join_context([formatted[i] for i in top], max_context_length)
+        return {query: contexts[normalize_query(query)] for query in queries}
+    
+    @staticmethod
+    def _format_chunk(chunk: Dict) -> str:
+        """One retrieved chunk as it appears in a prompt's context"""
+        return f"📚 **{chunk.get('chapter', '')}** - {chunk.get('subtopic', '')}:\n{chunk.get('chunk', '')}\n"
+    
+    @staticmethod
+    def _join_context(formatted_chunks: List[str], max_context_length: int) -> str:
+        """Join formatted chunks, best first, while they fit in max_context_length"""
+        if not formatted_chunks:
+            return "Physics concepts from Class 10 curriculum."
         
-        return "\n".join(context_parts)
+        # Keep the longest prefix whose running length fits
+        cutoff = bisect.bisect_right(list(accumulate(map(len, formatted_chunks))), max_context_length)
+        return "\n".join(formatted_chunks[:cutoff])
+    
+    def _context(self, query: str, max_context_length: int) -> str:
+        relevant_chunks = self._cached_search(query, 3)
+        return self._join_context([self._format_chunk(chunk) for chunk in relevant_chunks], max_context_length)
     
     def get_chapter_topics(self, chapter: str = None) -> List[str]:
         """Get all subtopics for a chapter or all topics"""
@@ -205,3 +253,139 @@ class RAGKnowledgeBase:
                 if topic and topic not in topics:
                     topics.append(topic)
         return topics
+
+class SemanticCache:
+    """Reuse AI answers for student questions that are worded differently but mean the same"""
+    
+    def __init__(self, model_name: str = SEMANTIC_CACHE_MODEL, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = 2000, ttl: float = 6 * 3600):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._model = None
+        self._disabled = False
+        self._loader = None
+        self._load_lock = threading.Lock()
+        self._namespaces = {}  # namespace -> {'embeddings': [...], 'responses': [...], 'created': [...], 'matrix': array|None}
+        self._lock = threading.Lock()
+    
+    def warm_up(self):
+        """Start loading the embedding model on a background thread (only once)"""
+        with self._load_lock:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self._load_model, name='semantic-cache-loader', daemon=True)
+                self._loader.start()
+    
+    def _load_model(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(self.model_name)
+            logger.info(f"✅ Semantic cache using {self.model_name}")
+        except Exception as e:
+            logger.warning(f"⚠️ Semantic cache disabled: {e}")
+            self._disabled = True
+            return
+        self._model = model
+    
+    def _embed(self, text: str):
+        """Return a normalized embedding, or None while the model is not loaded
+        
+        Requests never wait for the model: until the background load finishes
+        every lookup is a miss and nothing is added.
+        """
+        if self._disabled:
+            return None
+        if self._model is None:
+            self.warm_up()
+            return None
+        return self._model.encode(text.strip().lower(), normalize_embeddings=True)
+    
+    def _evict_expired(self, entries: Dict[str, Any]):
+        """Drop entries older than the namespace's TTL (entries are kept oldest first)"""
+        cutoff = time.time() - (entries.get('ttl') or self.ttl)
+        stale = 0
+        while stale < len(entries['created']) and entries['created'][stale] < cutoff:
+            stale += 1
+        overflow = max(len(entries['created']) - stale - self.max_entries, 0)
+        drop = stale + overflow
+        if drop:
+            for key in ('embeddings', 'responses', 'created'):
+                del entries[key][:drop]
+            entries['matrix'] = None
+    
+    def lookup(self, text: str, namespace: str = "default"):
+        """Return (response, embedding) for the closest cached question above the threshold"""
+        embedding = self._embed(text)
+        if embedding is None:
+            return None, None
+        
+        import numpy as np
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if not entries:
+                return None, embedding
+            self._evict_expired(entries)
+            if not entries['embeddings']:
+                return None, embedding
+            if entries['matrix'] is None:
+                entries['matrix'] = np.vstack(entries['embeddings'])
+            scores = entries['matrix'] @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return entries['responses'][best], embedding
+        return None, embedding
+    
+    def add(self, text: str, response: str, namespace: str = "default", embedding=None, ttl: float = None):
+        """Cache a response (pass the embedding returned by lookup to avoid re-encoding)
+        
+        ttl, if given, replaces the cache-wide TTL for the whole namespace.
+        """
+        if embedding is None:
+            embedding = self._embed(text)
+            if embedding is None:
+                return
+        with self._lock:
+            entries = self._namespaces.setdefault(
+                namespace, {'embeddings': [], 'responses': [], 'created': [], 'matrix': None})
+            if ttl:
+                entries['ttl'] = ttl
+            entries['embeddings'].append(embedding)
+            entries['responses'].append(response)
+            entries['created'].append(time.time())
+            entries['matrix'] = None
+            self._evict_expired(entries)
+    
+    def save(self, path: str):
+        """Persist cached entries so answers survive a restart"""
+        with self._lock:
+            data = {namespace: dict({key: list(entries[key]) for key in ('embeddings', 'responses', 'created')},
+                                    ttl=entries.get('ttl'))
+                    for namespace, entries in self._namespaces.items() if entries['responses']}
+        if not data:
+            return
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'wb') as f:
+                pickle.dump({'model': self.model_name, 'namespaces': data}, f)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not save semantic cache: {e}")
+    
+    def load(self, path: str):
+        """Load entries saved by save(), skipping expired ones and other models' embeddings"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load semantic cache: {e}")
+            return
+        if data.get('model') != self.model_name:
+            return
+        with self._lock:
+            for namespace, saved in data.get('namespaces', {}).items():
+                entries = dict(saved, matrix=None)
+                self._evict_expired(entries)
+                if entries['responses']:
+                    self._namespaces[namespace] = entries
@@ -1,58 +1,215 @@
+import logging
 import sqlite3
 import json
 from datetime import datetime
 import hashlib
+import threading
+import time
+import re
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'students.db'
+
+# One '@', no whitespace, and a dot in the domain
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+# One tuned connection per thread, opened on first use and reused afterwards
+_local = threading.local()
+_schema_checked = False
+_schema_lock = threading.Lock()
+
+def _get_conn():
+    """Return this thread's connection to students.db (autocommit, WAL)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-20000')
+        conn.execute('PRAGMA busy_timeout=5000')
+        _local.conn = conn
+    return conn
+
+class TTLCache:
+    """Small thread-safe in-memory LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entries when full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        """Store a value only if the key is missing or expired; returns whether it was stored"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] >= now:
+                return False
+            self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def pop(self, key, default=None):
+        """Remove and return a value (expired entries count as missing)"""
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+def cache_key(*parts):
+    """Short blake2b digest of the given parts, for in-memory cache keys"""
+    return hashlib.blake2b("\0".join(map(str, parts)).encode('utf-8'), digest_size=16).hexdigest()
 
 def create_tables_if_not_exist():
-    """Ensure all required tables exist with correct schema"""
-    conn = sqlite3.connect('students.db')
-    cursor = conn.cursor()
-    
-    # Check if column exists and add if missing
-    try:
-        cursor.execute("PRAGMA table_info(quiz_results)")
-        columns = [column[1] for column in cursor.fetchall()]
+    """Ensure all required tables exist with correct schema (checked once per process)"""
+    global _schema_checked
+    with _schema_lock:
+        if _schema_checked:
+            return
+        cursor = _get_conn().cursor()
         
-        if 'chapter' not in columns:
-            cursor.execute('ALTER TABLE quiz_results ADD COLUMN chapter TEXT')
-            print("✅ Added 'chapter' column to quiz_results table")
+        # Check if column exists and add if missing
+        try:
+            cursor.execute("PRAGMA table_info(quiz_results)")
+            columns = [column[1] for column in cursor.fetchall()]
             
-    except Exception as e:
-        print(f"Warning: Could not check/add column: {e}")
-    
-    conn.commit()
-    conn.close()
+            if 'chapter' not in columns:
+                cursor.execute('ALTER TABLE quiz_results ADD COLUMN chapter TEXT')
+                logger.info("✅ Added 'chapter' column to quiz_results table")
+                
+        except Exception as e:
+            logger.warning(f"Warning: Could not check/add column: {e}")
+        
+        _schema_checked = True
 
-def get_physics_performance_summary(student_id):
-    """Get detailed performance summary for all physics chapters"""
-    conn = sqlite3.connect('students.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT 
-            COALESCE(chapter, 'General Physics') as chapter,
-            COUNT(*) as quiz_count,
-            AVG(score) as avg_score,
-            MAX(score) as best_score,
-            MIN(score) as lowest_score,
-            MAX(quiz_date) as last_attempt
-        FROM quiz_results 
-        WHERE student_id = ?
-        GROUP BY COALESCE(chapter, 'General Physics')
-        ORDER BY avg_score DESC
-    ''', (student_id,))
-    
-    results = cursor.fetchall()
-    conn.close()
-    
-    return [{
+# Student ids per query in the bulk summary, well under SQLite's bound-variable limit
+BULK_SUMMARY_BATCH_SIZE = 500
+
+def _summary_entry(row):
+    """One chapter of a performance summary from a (chapter, count, avg, best, lowest, last) row"""
+    return {
         'chapter': row[0],
         'quiz_count': row[1],
         'avg_score': round(row[2], 1),
         'best_score': row[3],
         'lowest_score': row[4],
         'last_attempt': row[5]
-    } for row in results]
+    }
+
+def get_physics_performance_summary(student_id):
+    """Get detailed performance summary for all physics chapters"""
+    cursor = _get_conn().cursor()
+    
+    try:
+        # Pre-aggregated rows maintained by the quiz_results trigger (see app.init_db)
+        cursor.execute('''
+            SELECT chapter, attempts, sum_score * 1.0 / attempts as avg_score,
+                   best_score, lowest_score, last_attempt
+            FROM student_chapter_stats
+            WHERE student_id = ? AND attempts > 0
+            ORDER BY avg_score DESC
+        ''', (student_id,))
+    except sqlite3.OperationalError:
+        # Database without the stats table: aggregate the raw results
+        cursor.execute('''
+            SELECT 
+                COALESCE(chapter, 'General Physics') as chapter,
+                COUNT(*) as quiz_count,
+                AVG(score) as avg_score,
+                MAX(score) as best_score,
+                MIN(score) as lowest_score,
+                MAX(quiz_date) as last_attempt
+            FROM quiz_results 
+            WHERE student_id = ?
+            GROUP BY COALESCE(chapter, 'General Physics')
+            ORDER BY avg_score DESC
+        ''', (student_id,))
+    
+    results = cursor.fetchall()
+    
+    return [_summary_entry(row) for row in results]
+
+def get_physics_performance_summary_bulk(student_ids):
+    """Performance summaries for many students (e.g. a class report) in one query per batch
+    
+    Returns {student_id: [chapter summary, ...]} in the same shape as
+    get_physics_performance_summary; students without quizzes get an empty list.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    summaries = {student_id: [] for student_id in student_ids}
+    cursor = _get_conn().cursor()
+    
+    for start in range(0, len(student_ids), BULK_SUMMARY_BATCH_SIZE):
+        batch = student_ids[start:start + BULK_SUMMARY_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        try:
+            cursor.execute(f'''
+                SELECT student_id, chapter, attempts, sum_score * 1.0 / attempts as avg_score,
+                       best_score, lowest_score, last_attempt
+                FROM student_chapter_stats
+                WHERE student_id IN ({placeholders}) AND attempts > 0
+                ORDER BY student_id, avg_score DESC
+            ''', batch)
+        except sqlite3.OperationalError:
+            cursor.execute(f'''
+                SELECT 
+                    student_id,
+                    COALESCE(chapter, 'General Physics') as chapter,
+                    COUNT(*) as quiz_count,
+                    AVG(score) as avg_score,
+                    MAX(score) as best_score,
+                    MIN(score) as lowest_score,
+                    MAX(quiz_date) as last_attempt
+                FROM quiz_results 
+                WHERE student_id IN ({placeholders})
+                GROUP BY student_id, COALESCE(chapter, 'General Physics')
+                ORDER BY student_id, avg_score DESC
+            ''', batch)
+        
+        for row in cursor.fetchall():
+            summaries[row[0]].append(_summary_entry(row[1:]))
+    
+    return summaries
+
+def is_valid_email(email):
+    """Cheap sanity check for an email address"""
+    return bool(_EMAIL_RE.match(email))
 
 def validate_registration_data(form_data):
     """Validate registration form data"""
@@ -62,7 +219,7 @@ def validate_registration_data(form_data):
         errors.append("Full name is required")
     
     email = form_data.get('email', '').strip()
-    if not email or '@' not in email:
+    if not is_valid_email(email):
         errors.append("Valid email address is required")
     
     if not form_data.get('dob', '').strip():
@@ -84,6 +241,7 @@ def format_study_time(minutes):
         return f"{days}d {hours}h" if hours > 0 else f"{days}d"
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     # Run utility functions if needed
     create_tables_if_not_exist()
     print("✅ Utility functions checked and database updated if needed")